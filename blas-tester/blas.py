@@ -1,22 +1,34 @@
+import json
 import os
 
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+from vubhpc import sources
+from vubhpc.buildcache import BuildCacheMixin
+from vubhpc.references import ReferenceMixin
+from vubhpc.scaling import ThreadScalingMixin
+
 
 src_name = 'BLAS-Tester'
 src_version = '20160411'
 src_dir = f'{src_name}-{src_version}'
-src_url = 'https://github.com/xianyi/BLAS-Tester/archive/8e1f624.tar.gz'
-src_path = os.path.join(os.environ['REFRAME_SOURCEPATH'], src_name[0].lower(), src_name, f'{src_dir}.tar.gz')
 
-download_cmd = f'wget {src_url} -O {src_path}'
-extract_cmd = f'mkdir {src_dir} && tar -xzvf {src_path} --strip-components 1 -C {src_dir} && cd {src_dir}'
+extract_cmd = f'{sources.extract_cmd(src_dir, src_dir)} && cd {src_dir}'
 patch_cmd = "sed -i -e 's/-openmp/-qopenmp/g' Makefile.system"
 
+# result row of a test of x?l3blastst: test index, transposes, M, N, K, ..., time, MFLOP, speedup, PASS
+blas_row = r'^\s*(\d+)\s+[NTC]\s+[NTC]\s+(\d+)\s.*\s(\S+)\s+\S+\s+PASS'
+
+
+def read_sizes(path):
+    "return lists of the problem sizes (M) and MFLOPS of all tests in BLAS-Tester output file path"
+    rows = sn.evaluate(sn.extractall(blas_row, path, tag=(2, 3), conv=(int, float)))
+    return [size for size, _ in rows], [speed for _, speed in rows]
+
 
 @rfm.simple_test
-class BLASTest(rfm.RunOnlyRegressionTest):
+class BLASTest(rfm.RunOnlyRegressionTest, ReferenceMixin):
     "BLAS correctness and performance tests"
     exe = parameter(['xcl3', 'xdl3', 'xsl3', 'xzl3'])
     valid_systems = required
@@ -27,6 +39,10 @@ class BLASTest(rfm.RunOnlyRegressionTest):
     num_tasks_per_node = 1
     num_cpus_per_task = required
     exclusive_access = required
+    sizes_file = 'blas_sizes.json'
+    # lower bound of the peak efficiency in % of the theoretical peak of the partition, 0 to disable
+    # disabled by default until the theoretical peaks in config/config.py are calibrated
+    min_efficiency = variable(float, value=0.0)
 
     @run_after('init')
     def post_init(self):
@@ -35,34 +51,121 @@ class BLASTest(rfm.RunOnlyRegressionTest):
         self.env_vars = {
             'OMP_NUM_THREADS': f'{self.num_cpus_per_task}',
         }
+        self.keep_files = [self.sizes_file]
+
+    @run_after('setup')
+    def set_peak(self):
+        """
+        theoretical peak in MFLOPS of the cores of the test, from the 'extras' of the partition in config/config.py
+        single precision (xsl3, xcl3) has twice the FLOPs per cycle of double precision
+        """
+        extras = self.current_partition.extras
+        self.peak = None
+        if 'cpu_freq_ghz' in extras and 'flops_per_cycle' in extras:
+            precision = 2 if self.exe in ['xsl3', 'xcl3'] else 1
+            self.peak = self.num_cpus_per_task * extras['cpu_freq_ghz'] * 1000 * extras['flops_per_cycle'] * precision
+            if self.min_efficiency:
+                self.reference = {'*': {'efficiency': (self.min_efficiency, 0, None, '%')}}
 
     @require_deps
     def set_executable(self, BLASBuildTest):
-        self.executable = os.path.join(BLASBuildTest().stagedir, src_dir, 'bin', f'{self.exe}blastst')
+        self.executable = os.path.join(BLASBuildTest().build_prefix, 'bin', f'{self.exe}blastst')
+
+    def parse_sizes(self):
+        "return lists of the problem sizes (M) and MFLOPS of all tests, and save them in sizes_file"
+        if not hasattr(self, 'sizes'):
+            self.sizes, self.speeds = read_sizes(os.path.join(self.stagedir, sn.evaluate(self.stdout)))
+            with open(os.path.join(self.stagedir, self.sizes_file), 'w') as f:
+                json.dump({'exe': self.exe, 'size': self.sizes, 'mflops': self.speeds}, f, indent=1)
+        return self.sizes, self.speeds
 
     @sanity_function
     def assert_run(self):
-        return sn.assert_found(r'^10 tests run, 10 passed', self.stdout)
+        return sn.all([
+            sn.assert_found(r'^10 tests run, 10 passed', self.stdout),
+            sn.assert_eq(sn.count(sn.extractall(blas_row, self.stdout)), 10, msg='expected 10 result rows, found {0}'),
+        ])
 
     @performance_function('MFLOPS', perf_key='speed')
     def speed(self):
         return sn.extractsingle(rf'^\s+{self.test_index}.*\s+(\S+)\s+\S+\s+PASS', self.stdout, 1, float)
 
+    @performance_function('MFLOPS', perf_key='speed_peak')
+    def speed_peak(self):
+        "highest MFLOPS of all problem sizes"
+        return max(self.parse_sizes()[1])
+
+    @performance_function('', perf_key='size_peak')
+    def size_peak(self):
+        "problem size of the highest MFLOPS"
+        sizes, speeds = self.parse_sizes()
+        return sizes[speeds.index(max(speeds))]
+
+    @run_before('performance')
+    def set_efficiency(self):
+        "highest MFLOPS in % of the theoretical peak, only in partitions with a known peak"
+        if self.peak:
+            self.perf_variables['efficiency'] = sn.make_performance_function(
+                sn.defer(100 * max(self.parse_sizes()[1]) / self.peak), '%'
+            )
+
+
+def thread_peak_speed(path):
+    "highest MFLOPS of all problem sizes in the output file of a thread scaling step"
+    if not os.path.isfile(path) or not sn.evaluate(sn.findall(r'^10 tests run, 10 passed', path)):
+        return None
+    return max(read_sizes(path)[1], default=None)
+
 
 @rfm.simple_test
-class BLASBuildTest(rfm.CompileOnlyRegressionTest):
+class BLASThreadScalingTest(rfm.RunOnlyRegressionTest, ThreadScalingMixin, ReferenceMixin):
+    "BLAS OpenMP thread scaling test, with 1, 2, 4, ... threads up to all cores of the node"
+    exe = parameter(['xcl3', 'xdl3', 'xsl3', 'xzl3'])
+    valid_systems = required
+    valid_prog_environs = required
+    time_limit = '30m'
+    num_tasks = 1
+    num_tasks_per_node = 1
+    exclusive_access = True
+    # runs on demand, not with the weekly blas-tester tests
+    tags = {'thread_scaling'}
+    scaling_unit = 'MFLOPS'
+    thread_result = thread_peak_speed
+
+    @run_after('init')
+    def post_init(self):
+        self.descr = f'BLAS-Tester {self.exe} thread scaling test'
+        self.depends_on('BLASBuildTest')
+        self.env_vars = {
+            'OMP_PLACES': 'cores',
+        }
+
+    @require_deps
+    def set_executable(self, BLASBuildTest):
+        self.executable = os.path.join(BLASBuildTest().build_prefix, 'bin', f'{self.exe}blastst')
+
+
+@rfm.simple_test
+class BLASBuildTest(rfm.CompileOnlyRegressionTest, BuildCacheMixin):
     descr = 'BLAS-Tester build test'
     valid_systems = required
     valid_prog_environs = required
     build_locally = False
     sourcesdir = None
     prebuild_cmds = [
-        download_cmd if not os.path.isfile(src_path) else '',
         extract_cmd,
         patch_cmd,
     ]
     build_system = 'Make'
     num_cpus_per_task = required
+    build_cache_sources = [src_dir]
+    build_cache_tree = src_dir
+    # NUMTHREADS of the build
+    build_cache_variables = ['num_cpus_per_task']
+
+    @run_after('setup')
+    def fetch_sources(self):
+        sources.fetch(src_dir)
 
     @run_after('setup')
     def set_cpus_per_task(self):
@@ -2,16 +2,18 @@ import os
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+from vubhpc import sources
+from vubhpc.buildcache import BuildCacheMixin
+from vubhpc.references import ReferenceMixin
+from vubhpc.scaling import ThreadScalingMixin
+
 src_name = 'c-ray'
 src_version = '1.1'
 src_dir = f'{src_name}-{src_version}'
-src_url = f'https://www.phoronix.net/downloads/phoronix-test-suite/benchmark-files/{src_dir}.tar.gz'
-src_path = os.path.join(os.environ['REFRAME_SOURCEPATH'], src_name[0].lower(), src_name, f'{src_dir}.tar.gz')
-download_cmd = f'wget {src_url} -O {src_path}'
-extract_cmd = f'mkdir {src_dir} && tar -xzvf {src_path} --strip-components 1 -C {src_dir} && cd {src_dir}'
+extract_cmd = f'{sources.extract_cmd(src_dir, src_dir)} && cd {src_dir}'
 
 
-class c_rayTestBase(rfm.RunOnlyRegressionTest):
+class c_rayTestBase(rfm.RunOnlyRegressionTest, ReferenceMixin):
     "base class for c-ray test"
     descr = 'c-ray ray tracing test (FPU performance)'
     time_limit = '15m'
@@ -43,7 +45,7 @@ class c_rayTestSC(c_rayTestBase):
 
     @require_deps
     def set_executable(self, c_rayBuildTest):
-        builddir = os.path.join(c_rayBuildTest().stagedir, src_dir)
+        builddir = c_rayBuildTest().build_prefix
         resolution = '5000x2500'
         rays = '4'
         self.executable = os.path.join(builddir, self.exe)
@@ -70,7 +72,7 @@ class c_rayTestMC(c_rayTestBase):
 
     @require_deps
     def set_executable(self, c_rayBuildTest):
-        builddir = os.path.join(c_rayBuildTest().stagedir, src_dir)
+        builddir = c_rayBuildTest().build_prefix
         resolution = '7000x3500'
         rays = '8'
         self.executable = os.path.join(builddir, self.exe)
@@ -83,20 +85,77 @@ class c_rayTestMC(c_rayTestBase):
         ]
 
 
+def thread_render_time(path):
+    "rendering time in s in the output file of a thread scaling step, in milliseconds if c-ray prints them"
+    if not os.path.isfile(path):
+        return None
+    millisecs = sn.evaluate(sn.extractall(r'^Rendering took: \d+ seconds \((\d+) milliseconds\)', path, 1, int))
+    if millisecs:
+        return millisecs[0] / 1000
+    secs = sn.evaluate(sn.extractall(r'^Rendering took: (\d+) seconds', path, 1, int))
+    return secs[0] if secs else None
+
+
 @rfm.simple_test
-class c_rayBuildTest(rfm.CompileOnlyRegressionTest):
+class c_rayThreadScalingTest(rfm.RunOnlyRegressionTest, ThreadScalingMixin, ReferenceMixin):
+    "c-ray thread scaling test, with 1, 2, 4, ... threads up to all cores of the node"
+    descr = 'c-ray ray tracing thread scaling test'
+    time_limit = '1h'
+    testfile = 'sphfract'
+    exe = 'c-ray-mt'
+    valid_systems = required
+    valid_prog_environs = required
+    num_tasks = 1
+    num_tasks_per_node = 1
+    exclusive_access = True
+    # runs on demand, not with the weekly c-ray tests
+    tags = {'thread_scaling'}
+    scaling_metric = 'time'
+    scaling_unit = 's'
+    scaling_rate = False
+    thread_result = thread_render_time
+
+    @run_after('init')
+    def post_init(self):
+        self.depends_on('c_rayBuildTest')
+        self.env_vars = {
+            'OMP_PLACES': 'sockets',
+        }
+
+    @require_deps
+    def set_executable(self, c_rayBuildTest):
+        builddir = c_rayBuildTest().build_prefix
+        resolution = '5000x2500'
+        rays = '4'
+        self.executable = os.path.join(builddir, self.exe)
+        self.executable_opts = [
+            '-i', os.path.join(builddir, self.testfile),
+            '-s', resolution,
+            '-r', rays,
+            '-t', '$OMP_NUM_THREADS',
+            '>/dev/null',
+        ]
+
+
+@rfm.simple_test
+class c_rayBuildTest(rfm.CompileOnlyRegressionTest, BuildCacheMixin):
     descr = 'c-ray build test'
     valid_systems = required
     valid_prog_environs = required
     sourcesdir = None
     prebuild_cmds = [
-        download_cmd if not os.path.isfile(src_path) else '',
         extract_cmd,
         'make clean',
     ]
     build_locally = False
     build_system = 'Make'
     num_cpus_per_task = required
+    build_cache_sources = [src_dir]
+    build_cache_tree = src_dir
+
+    @run_after('setup')
+    def fetch_sources(self):
+        sources.fetch(src_dir)
 
     @run_after('setup')
     def set_resources(self):
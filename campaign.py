@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+run a campaign of run.py sessions concurrently
+
+each session can submit 1 job at a time to each of its ReFrame partitions with the 'serial' execution policy, and up to
+the 'max_jobs' of the partition in config/config.py otherwise (ReFrame applies max_jobs in each session); a session is
+started as soon as the jobs of the running sessions leave room for its jobs within the max_jobs of every partition it
+runs in, and every shared resource it uses has less running sessions than its limit in shared_resources
+the output of each session is written to its own log file, the exit code is 1 if any session failed
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+import importlib.util
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+
+import run
+
+REFRAME_HOME = os.path.dirname(os.path.abspath(__file__))
+
+# ReFrame default for partitions without 'max_jobs'
+DEFAULT_MAX_JOBS = 8
+
+# maximum number of concurrent sessions using each shared resource
+shared_resources = {
+    # the IOR tests measure the shared scratch file system and use the same test directories in it
+    'scratch': 1,
+}
+
+# sessions of each campaign: run.py arguments, or tuple of run.py arguments and shared resources
+campaigns = {
+    'weekly': [
+        # shared storage test, one session at a time
+        ('-c ior --partitions skylake-mn-mpi-ib', ['scratch']),
+        ('-c ior --partitions skylake-mn-mpi-eth', ['scratch']),
+        ('-c ior --partitions zen5-mpi', ['scratch']),
+
+        # multi-node tests
+        '-c osu',
+        '-c gromacs_bench -n GMXBenchMEMMultiNode',
+        '-c cp2k_tests -n CP2KTestMultiNode',
+
+        # single-node tests
+        '-c blas-tester',
+        '-c c-ray',
+        '-c stream',
+        '-c memlat',
+        '-c gromacs_bench -n GMXBenchMEMSingleNode',
+        '-c gromacs_bench -n GMXBenchMEMSingleNodeGPU',
+        '-c cp2k_tests -n CP2KTestSingleNode',
+    ],
+}
+
+
+def load_max_jobs(system):
+    "return dict of 'system:partition' and max_jobs for each partition of system in config/config.py"
+    spec = importlib.util.spec_from_file_location('config', os.path.join(REFRAME_HOME, 'config', 'config.py'))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+
+    for sysconfig in config.site_configuration['systems']:
+        if sysconfig['name'] == system:
+            return {f'{system}:{x["name"]}': x.get('max_jobs', DEFAULT_MAX_JOBS) for x in sysconfig['partitions']}
+
+    raise ValueError(f'system {system} not found in config/config.py')
+
+
+def session_label(args):
+    "unique and file system friendly label of a run.py session"
+    label = '_'.join(args.checkpath + (args.name or []) + (args.partitions or '').split(','))
+    return re.sub(r'[^\w.-]+', '_', label).strip('_')
+
+
+def make_sessions(campaign, system, extra_args):
+    "return list of sessions (dicts) of the given campaign"
+    sessions = []
+    for session_args in campaigns[campaign]:
+        session_args, resources = session_args if isinstance(session_args, tuple) else (session_args, [])
+        args, session_extra = run.parser.parse_known_args(shlex.split(session_args) + ['--system', system])
+        cmd, valid_systems = run.reframe_cmd(args, session_extra + extra_args)
+        sessions.append({
+            'label': session_label(args),
+            'cmd': ' '.join(cmd),
+            'partitions': valid_systems,
+            'resources': resources,
+            'serial': bool(re.search(r'--exec-policy[= ]serial\b', ' '.join(cmd))),
+        })
+    return sessions
+
+
+def log(msg):
+    print(f'[{datetime.now():%Y-%m-%d %H:%M:%S}] {msg}', flush=True)
+
+
+def run_campaign(sessions, max_jobs, logdir, max_sessions, poll_interval=10):
+    """
+    run sessions concurrently, respecting max_jobs of each partition and the limits of shared_resources
+    returns dict of session label and exit code
+    """
+    def session_jobs(session, partition):
+        "maximum number of concurrent jobs of the session in the partition"
+        return 1 if session['serial'] else max_jobs.get(partition, DEFAULT_MAX_JOBS)
+
+    os.makedirs(logdir, exist_ok=True)
+
+    pending = list(sessions)
+    running = []
+    load = {x: 0 for x in max_jobs}
+    resource_load = {x: 0 for x in shared_resources}
+    exitcodes = {}
+
+    while pending or running:
+        for session in list(pending):
+            if len(running) >= max_sessions:
+                break
+            if any(load.get(x, 0) + session_jobs(session, x) > max_jobs.get(x, DEFAULT_MAX_JOBS)
+                   for x in session['partitions']):
+                continue
+            if any(resource_load[x] >= shared_resources[x] for x in session['resources']):
+                continue
+
+            logfile = os.path.join(logdir, f'{session["label"]}.log')
+            session['log'] = open(logfile, 'w', encoding='utf-8')
+            session['log'].write(session['cmd'] + '\n')
+            session['log'].flush()
+            session['proc'] = subprocess.Popen(
+                session['cmd'],
+                shell=True,
+                stdout=session['log'],
+                stderr=subprocess.STDOUT,
+                cwd=REFRAME_HOME,
+                env=dict(os.environ, REFRAME_SESSION=session['label']),
+            )
+            for partition in session['partitions']:
+                load[partition] = load.get(partition, 0) + session_jobs(session, partition)
+            for resource in session['resources']:
+                resource_load[resource] += 1
+            pending.remove(session)
+            running.append(session)
+            log(f'started {session["label"]} (log: {logfile})')
+
+        for session in list(running):
+            exitcode = session['proc'].poll()
+            if exitcode is None:
+                continue
+
+            session['log'].close()
+            for partition in session['partitions']:
+                load[partition] -= session_jobs(session, partition)
+            for resource in session['resources']:
+                resource_load[resource] -= 1
+            running.remove(session)
+            exitcodes[session['label']] = exitcode
+            log(f'finished {session["label"]} with exit code {exitcode}')
+
+        if pending or running:
+            time.sleep(poll_interval)
+
+    return exitcodes
+
+
+def main():
+    parser = ArgumentParser(
+        description=__doc__,
+        epilog='any additional options not listed here are passed to all sessions',
+    )
+    parser.add_argument('--campaign', dest='campaign', choices=sorted(campaigns), default='weekly',
+                        help='campaign to run')
+    parser.add_argument('--system', dest='system', choices=['anansi', 'hydra', 'local', 'manticore'],
+                        default='hydra', help='run tests in given cluster')
+    parser.add_argument('--logdir', dest='logdir',
+                        default=os.path.join(os.getenv('RFM_PREFIX', os.curdir), 'logs',
+                                             f'campaign_{datetime.now():%Y%m%d_%H%M%S}'),
+                        help='directory of the session log files')
+    parser.add_argument('--max-sessions', dest='max_sessions', type=int, default=16,
+                        help='maximum number of concurrent sessions')
+    args, extra_args = parser.parse_known_args()
+
+    max_jobs = load_max_jobs(args.system)
+    sessions = make_sessions(args.campaign, args.system, extra_args)
+    exitcodes = run_campaign(sessions, max_jobs, args.logdir, args.max_sessions)
+
+    failed = [label for label, exitcode in exitcodes.items() if exitcode != 0]
+    for label in failed:
+        log(f'FAILED: {label}')
+
+    # add the new performance records to the perflog store (RFM_PERFLOG_DIR is set in sourceme.sh)
+    perflog_dir = os.getenv('RFM_PERFLOG_DIR')
+    if perflog_dir and os.path.isdir(perflog_dir):
+        from vubhpc import perfstore
+        count = perfstore.ingest(perflog_dir)
+        log(f'ingested {count} performance records into {perfstore.store_path(perflog_dir)}')
+
+    sys.exit(min(len(failed), 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,7 @@ perf_logging_format = 'reframe: ' + '|'.join([
     'perf_var=%(check_perf_var)s',
     'perf_value=%(check_perf_value)s',
     'unit=%(check_perf_unit)s',
+    'nodelist=%(check_job_nodelist)s',
 ])
 
 environs_cpu = [
@@ -58,6 +59,20 @@ if os.getenv('REFRAME_QUIET_MODULE_LOAD', '').lower() in ['yes', '1', 'true']:
 
 sched_options = {'use_nodes_option': True}
 
+# theoretical peak of a core of the CPUs of a partition, added to the 'extras' of the partitions:
+# nominal base frequency in GHz and double-precision FLOPs per cycle (FMA units * vector width * 2)
+cpu_peak = {
+    'skylake': {'cpu_freq_ghz': 2.6, 'flops_per_cycle': 32},  # 2x AVX-512 FMA
+    'zen4': {'cpu_freq_ghz': 3.1, 'flops_per_cycle': 16},  # 2x 256-bit FMA, AVX-512 in two halves
+    'zen5': {'cpu_freq_ghz': 2.4, 'flops_per_cycle': 32},  # 2x AVX-512 FMA
+}
+
+# concurrent sessions started by campaign.py or by a node sweep of run.py each write their own log files
+session = os.getenv('REFRAME_SESSION')
+log_basename = os.path.join(
+    os.getenv('RFM_OUTPUT_DIR', os.curdir), 'logs', f'reframe_{session}' if session else 'reframe'
+)
+
 site_configuration = {
     'systems': [
         {
@@ -112,6 +127,7 @@ site_configuration = {
                     'descr': 'single-node jobs in Skylake nodes',
                     'max_jobs': 10,
                     'launcher': 'local',
+                    'extras': cpu_peak['skylake'],
                 },
                 {
                     'name': 'skylake-sn-mpi',
@@ -124,6 +140,7 @@ site_configuration = {
                     'descr': 'single-node MPI jobs in Skylake nodes',
                     'max_jobs': 10,
                     'launcher': 'srun',
+                    'extras': cpu_peak['skylake'],
                 },
                 {
                     'name': 'skylake-mn-mpi-ib',
@@ -136,6 +153,7 @@ site_configuration = {
                     'descr': 'multi-node MPI jobs in Skylake nodes with infiniband',
                     'max_jobs': 1,
                     'launcher': 'srun',
+                    'extras': {**cpu_peak['skylake'], 'max_nodes': 16},
                 },
                 {
                     'name': 'skylake-mn-mpi-eth',
@@ -148,6 +166,7 @@ site_configuration = {
                     'descr': 'multi-node MPI jobs in Skylake nodes without infiniband',
                     'max_jobs': 1,
                     'launcher': 'srun',
+                    'extras': cpu_peak['skylake'],
                 },
                 {
                     'name': 'broadwell-sn',
@@ -184,6 +203,7 @@ site_configuration = {
                     'descr': 'single-node jobs in Zen4 nodes',
                     'max_jobs': 10,
                     'launcher': 'local',
+                    'extras': cpu_peak['zen4'],
                 },
                 {
                     'name': 'zen4-mpi',
@@ -196,6 +216,7 @@ site_configuration = {
                     'descr': 'MPI jobs in Zen4 nodes',
                     'max_jobs': 1,
                     'launcher': 'srun',
+                    'extras': {**cpu_peak['zen4'], 'max_nodes': 16},
                 },
                 {
                     'name': 'zen5-sn',
@@ -208,6 +229,7 @@ site_configuration = {
                     'descr': 'single-node jobs in Zen5 nodes',
                     'max_jobs': 10,
                     'launcher': 'local',
+                    'extras': cpu_peak['zen5'],
                 },
                 {
                     'name': 'zen5-mpi',
@@ -220,6 +242,7 @@ site_configuration = {
                     'descr': 'MPI jobs in Zen5 nodes',
                     'max_jobs': 1,
                     'launcher': 'srun',
+                    'extras': {**cpu_peak['zen5'], 'max_nodes': 16},
                 },
                 {
                     'name': 'broadwell-pascal-sn-gpu',
@@ -367,6 +390,7 @@ site_configuration = {
                     'descr': 'MPI jobs in (virtualized) Zen3 nodes',
                     'max_jobs': 1,
                     'launcher': 'srun',
+                    'extras': {'max_nodes': 4},
                 },
                 {
                     'name': 'zen3-ampere-sn-gpu',
@@ -462,7 +486,7 @@ site_configuration = {
             'handlers': [
                 {
                     'type': 'file',
-                    'name': os.path.join(os.getenv('RFM_OUTPUT_DIR', os.curdir), 'logs', 'reframe.log'),
+                    'name': f'{log_basename}.log',
                     'level': 'debug',
                     'format': '[%(asctime)s] %(levelname)s: %(check_name)s: %(message)s',  # noqa: E501
                     'append': False,
@@ -476,7 +500,7 @@ site_configuration = {
                 },
                 {
                     'type': 'file',
-                    'name': os.path.join(os.getenv('RFM_OUTPUT_DIR', os.curdir), 'logs', 'reframe.out'),
+                    'name': f'{log_basename}.out',
                     'level': 'info',
                     'format': '%(message)s',
                     'append': False,
@@ -1,26 +1,35 @@
-import os
+import shutil
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+from vubhpc import inputs
+from vubhpc.references import ReferenceMixin
+
 src_name = 'cp2k'
 src_version = '6.1'  # this is the version of the test, not necessarily the version of the software!
 src_dir = f'{src_name}-{src_version}'
-src_path = os.path.join(os.environ['REFRAME_SOURCEPATH'], src_name[0].lower(), src_name.upper(), f'{src_dir}.tar.bz2')
-testfile = 'H2O-128'
-dir_cmd = (
-    f'mkdir {src_dir} && cd {src_dir}'
-    f' && tar -xvf {src_path} {src_name}-{src_version}/tests/QS/benchmark/{testfile}.inp --strip-components 4'
-)
+benchmark_dir = f'{src_dir}/tests/QS/benchmark'
+
+# reference energy (None if not known yet), number of MD steps and time limit of the benchmark inputs in the CP2K
+# test suite
+# select another benchmark of this table with '--setvar benchmark=<name>'
+# or run several benchmarks with '--parameterize benchmark=<name>,<name>' (the test names then differ, so that each
+# benchmark has its own performance references)
+benchmarks = {
+    'H2O-128': {'energy': -2202.1791, 'steps': 10, 'time_limit': '20m'},
+    # energy checked once a run with known good results gives the reference energy
+    'H2O-256': {'energy': None, 'steps': 10, 'time_limit': '1h'},
+    'H2O-512': {'energy': None, 'steps': 10, 'time_limit': '4h'},
+}
 
 
-class CP2KTestBase(rfm.RunOnlyRegressionTest):
+class CP2KTestBase(rfm.RunOnlyRegressionTest, ReferenceMixin):
     "base class for CP2K tests"
-    descr = f'CP2K test {testfile}'
+    benchmark = variable(str, value='H2O-128')
+    descr = 'CP2K test benchmark'
     valid_systems = required
     valid_prog_environs = ['default']
     executable = 'cp2k.popt'
-    executable_opts = ['-i', f'{testfile}.inp']
-    time_limit = '20m'
     env_vars = {
         'OMP_NUM_THREADS': '1',  # necessary when running with MPI
     }
@@ -28,23 +37,38 @@ class CP2KTestBase(rfm.RunOnlyRegressionTest):
     modules = required
     num_tasks = required
     num_cpus_per_task = 1
-    prerun_cmds = [dir_cmd]
+
+    @run_after('init')
+    def set_benchmark(self):
+        self.descr = self.descr.replace('benchmark', self.benchmark)
+        self.executable_opts = ['-i', f'{self.benchmark}.inp']
+        self.time_limit = benchmarks[self.benchmark]['time_limit']
+
+    @run_before('run')
+    def stage_input(self):
+        # input files are extracted once from the (large) archive into the input cache
+        member = f'{benchmark_dir}/{self.benchmark}.inp'
+        cached = inputs.prepare(src_dir, [member])
+        shutil.copy(cached[member], self.stagedir)
 
     @sanity_function
     def assert_energy(self):
         energy = sn.extractsingle(
             r'\s+ENERGY\| Total FORCE_EVAL \( QS \) energy \[a\.u\.\]:\s+(?P<energy>\S+)',
             self.stdout, 'energy', float, item=-1)
-        energy_ref = -2202.1791
-        energy_diff = sn.abs(energy - energy_ref)
-        step_count_ref = 10
-        return sn.all([
+        energy_ref = benchmarks[self.benchmark]['energy']
+        step_count_ref = benchmarks[self.benchmark]['steps']
+        checks = [
             sn.assert_found(r'PROGRAM STOPPED IN', self.stdout),
             sn.assert_eq(sn.count(sn.extractall(
                 r'(?P<step_count>Step number)',
                 self.stdout, 'step_count')), step_count_ref),
-            sn.assert_lt(energy_diff, 1e-4)
-        ])
+        ]
+        if energy_ref is not None:
+            checks.append(sn.assert_lt(sn.abs(energy - energy_ref), 1e-4))
+        else:
+            checks.append(sn.assert_true(energy))
+        return sn.all(checks)
 
     @performance_function('s', perf_key='time')
     def time(self):
@@ -3,34 +3,50 @@ import os
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+from vubhpc import inputs
+from vubhpc.references import ReferenceMixin
+
 homepage = 'https://www.mpibpc.mpg.de/grubmueller/bench'
-src_name = 'benchMEM'
-src_version = '20200626'
-src_sha256 = '3c1c8cd4f274d532f48c4668e1490d389486850d6b3b258dfad4581aa11380a4'
-src_dir = f'{src_name}-{src_version}'
-src_url = 'https://www.mpibpc.mpg.de/15101317/benchMEM.zip'
-src_path = os.path.join(os.environ['REFRAME_SOURCEPATH'], src_name[0].lower(), src_name, f'{src_dir}.zip')
 
-download_cmd = f'wget {src_url} -O {src_path}'
-checksum_cmd = f'sha256sum -c <(echo {src_sha256} {src_path})'
-extract_cmd = f'mkdir {src_dir} && unzip {src_path} -d {src_dir} && cd {src_dir}'
+# source archive (see vubhpc.sources), input file and number of steps of each benchmark
+# select another benchmark with '--setvar benchmark=benchRIB'
+# or run several benchmarks with '--parameterize benchmark=benchMEM,benchRIB'
+benchmarks = {
+    'benchMEM': {'source': 'benchMEM-20200626', 'tpr': 'benchMEM.tpr', 'nsteps': 12000, 'resetstep': 7000},
+    'benchRIB': {'source': 'benchRIB', 'tpr': 'benchRIB.tpr', 'nsteps': 2000, 'resetstep': 1000},
+    'benchPEP': {'source': 'benchPEP', 'tpr': 'benchPEP.tpr', 'nsteps': 1000, 'resetstep': 500},
+}
 
 
-class GMXBenchMEMBase(rfm.RunOnlyRegressionTest):
+class GMXBenchMEMBase(rfm.RunOnlyRegressionTest, ReferenceMixin):
     """ base clase for BenchMEM test """
-    descr = 'GROMACS benchMEM test'
+    benchmark = variable(str, value='benchMEM')
+    descr = 'GROMACS benchmark test'
     valid_systems = required
     valid_prog_environs = ['default']
-    prerun_cmds = [
-        download_cmd if not os.path.isfile(src_path) else '',
-        checksum_cmd + ' && ' + extract_cmd,
-    ]
     time_limit = '10m'
-    executable_opts = ['-s', 'benchMEM.tpr', '-nsteps', '12000', '-resetstep', '7000']
-    logfile = os.path.join(f'{src_dir}', 'md.log')
+    logfile = 'md.log'
     modules = required
     exclusive_access = required
 
+    @run_after('init')
+    def set_benchmark(self):
+        bench = benchmarks[self.benchmark]
+        self.descr = self.descr.replace('benchmark', self.benchmark)
+        self.executable_opts = [
+            '-s', bench['tpr'], '-nsteps', str(bench['nsteps']), '-resetstep', str(bench['resetstep']),
+        ]
+
+    @run_before('run')
+    def stage_input(self):
+        # the archive is verified and extracted once into the input cache, link the input file from there
+        bench = benchmarks[self.benchmark]
+        cached = inputs.prepare(bench['source'], [bench['tpr']])
+        link = os.path.join(self.stagedir, bench['tpr'])
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(cached[bench['tpr']], link)
+
     @sanity_function
     def sanity_run(self):
         return sn.assert_found(r'^Finished mdrun', self.logfile)
@@ -1,18 +1,22 @@
+import json
 import os
 import reframe as rfm
 import reframe.utility.sanity as sn
+import reframe.utility.typecheck as typ
+from reframe.core.backends import getlauncher
 import shlex
+import shutil
+import statistics
 import subprocess
 
+from vubhpc import sources
+from vubhpc.buildcache import BuildCacheMixin
+from vubhpc.references import ReferenceMixin
+
 src_name = 'IOR'
 src_version = '3.3.0'
 src_dir = f'{src_name}-{src_version}'
-src_file = f'{src_version}.tar.gz'
-src_url = f'https://github.com/hpc/ior/archive/{src_file}'
-src_base = os.path.join(os.environ['REFRAME_SOURCEPATH'], src_name[0].lower(), src_name)
-src_path = os.path.join(src_base, src_file)
-download_cmd = f'mkdir -p {src_base} && wget {src_url} -O {src_path}'
-extract_cmd = f'mkdir {src_dir} && tar -xzvf {src_path} --strip-components 1 -C {src_dir} && cd {src_dir}'
+extract_cmd = f'{sources.extract_cmd(src_dir, src_dir)} && cd {src_dir}'
 
 
 """
@@ -20,18 +24,18 @@ ior shared scratch storage read/write tests
 options:
 -o <path/to/testfile>  -- outputfile
       write to the VO scratch to make sure there is enough space.
-      the current test writes 4 files (one per MPI process) of 16GB (64MB blocks * 256 segments) to disk
 -t 4m  -- transferSize
 -b 64m  -- blockSize
 -s 256  -- segmentCount
+      the tests write num_tasks * blockSize * segmentCount bytes, see iorTestBase.set_sizes and segment_cmds
 -C  -- reorderTasks
         change task ordering for readback
         make sure that each MPI process is reading data it did not write, to avoid reading from page cache
 -F  -- filePerProcess=1 one file per process instead of a single shared file. improves performance a lot
 -e  -- fsync makes sure writes are done to the file system instead of to the page cache
--v  -- verbose
 -D 120  -- deadlineForStonewalling in seconds before stopping write or read phase
--M 90%  --  hog memory on the node for reading
+      only without memory sizing: stonewalling writes less data than sized to exceed the page cache
+-M 90%  --  hog memory on the node for reading (the read test hogs memory with -M <bytes>, see iorTestBase.memory_cmds)
      limit the amount of memory available for page cache by allocating most of the memory on a node
      forces most of the cached pages to be evicted
      note that this is relative to the amount of memory available on the node, not the memory allocated to the job
@@ -41,75 +45,361 @@ options:
 -k  -- keepfile (only for the write test, since we need the files for the read test)
 -r  -- read existing file
 -q  -- quitOnError during file error-checking, abort on error
--v  -- verbose
-(-z  -- randomOffset - access is to random, not sequential, offsets within a file) not used currently
+-z  -- randomOffset - access is to random, not sequential, offsets within a file
+-O summaryFormat=JSON -O summaryFile=<file>  -- write the summary of the results in JSON to <file>
+-a POSIX|MPIIO  -- api of the I/O calls (default POSIX)
+-c  -- collective MPI-IO calls (only with -a MPIIO)
+-U <path/to/hintsfile>  -- MPI-IO hints, one hint per line, e.g.:
+      IOR_HINT__MPI__romio_cb_write=enable
+      IOR_HINT__MPI__cb_nodes=4
 """
 
 
-class iorTestBase(rfm.RunOnlyRegressionTest):
-    "base class for ior tests"
+def size_bytes(size):
+    "return number of bytes of IOR size string such as 4k, 64m or 1g"
+    units = {'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+    size = size.lower()
+    if size[-1] in units:
+        return int(size[:-1]) * units[size[-1]]
+    return int(size)
+
+
+def read_ior_summary(path, operation):
+    """
+    return the summary of the operation and the list of results of its iterations in the JSON summary file of IOR
+    the summary is None if IOR did not write it
+    """
+    try:
+        with open(path) as f:
+            output = json.load(f)
+    except (OSError, ValueError):
+        return None, []
+
+    summary = next((x for x in output.get('summary', []) if x['operation'] == operation), None)
+
+    # results are nested in lists per test and per iteration
+    results = [x for test in output.get('tests', []) for x in test.get('Results', [])]
+    while any(isinstance(x, list) for x in results):
+        results = [y for x in results for y in (x if isinstance(x, list) else [x])]
+    return summary, [x for x in results if x.get('access') == operation]
+
+
+class iorTestBase(rfm.RunOnlyRegressionTest, ReferenceMixin):
+    """
+    base class for ior tests
+    subclasses define the IOR configuration in transfer_size, file_per_process and random_offset
+    """
     valid_systems = required
     valid_prog_environs = required
-    time_limit = '5m'
+    # the data exceeds the memory of the node with memory sizing
+    time_limit = '1h'
     exe = 'ior'
-    testfile = os.path.join(
-        os.getenv('VSC_SCRATCH_VO_USER','doesnotexist'),
-        'reframe_iortest',
-        'ior_testfile',
-    )
+    scratch_dir = os.path.join(os.getenv('VSC_SCRATCH_VO_USER','doesnotexist'), 'reframe_iortest')
     num_tasks = required
     num_cpus_per_task = 1  # ior uses MPI
     exclusive_access = required
+    # IOR operation of the test: write or read
+    operation = None
+    # options of the write or read phase
+    operation_opts = []
+    summary_file = 'ior_summary.json'
+
+    # the read test hogs memory with -M
+    hog_memory = False
+    # segment count chosen by the write test, read by the read test
+    sizes_file = 'ior_sizes'
+
+    block_size = variable(str, value='64m')
+    # upper bound of the number of transfers of all tasks combined
+    total_transfers = variable(int, value=1 << 20)
+    # size the data at run time relative to the memory of the node (see memory_cmds),
+    # or to total_bytes of data (upper bound with transfer_size * total_transfers)
+    memory_sizing = variable(typ.Bool, value=True)
+    # only used with memory_sizing=false
+    total_bytes = variable(str, value='64g')
+    # the data exceeds the memory of the node that is available for page cache by this factor
+    cache_margin = variable(float, value=1.25)
+    # memory of the job that is not hogged, for IOR and MPI themselves
+    memory_reserve = variable(str, value='2g')
+    # maximum hogged memory in % of the memory of the node
+    memory_hog_max = variable(int, value=90)
+    # minimum hogged memory in % of the memory of the node, the job fails before running IOR below it
+    memory_hog_min = variable(int, value=50)
+
+    def test_label(self):
+        "return label of the IOR configuration, used as name of the directory of the test files"
+        layout = 'fpp' if self.file_per_process else 'shared'
+        access = 'random' if self.random_offset else 'sequential'
+        return f'{self.transfer_size}-{layout}-{access}'
 
     @run_after('init')
-    def set_executable_opts(self):
-        self.executable_opts = [
+    def set_testfile(self):
+        self.testfile = os.path.join(self.scratch_dir, self.test_label(), 'ior_testfile')
+        self.num_tasks_per_node = self.num_tasks
+        self.keep_files = [self.summary_file]
+
+    @run_after('setup')
+    def set_sizes(self):
+        """
+        set block size and (maximum) segment count within the budget of total_bytes and total_transfers
+        the block size is reduced (in multiples of the transfer size) if the budget is less than 1 block per task
+        """
+        transfer = size_bytes(self.transfer_size)
+        max_bytes = transfer * self.total_transfers
+        budget = max_bytes if self.memory_sizing else min(size_bytes(self.total_bytes), max_bytes)
+        per_task = max(transfer, budget // self.num_tasks)
+        self.block_bytes = min(size_bytes(self.block_size), per_task) // transfer * transfer
+        self.segment_count = max(1, per_task // self.block_bytes)
+
+    @run_after('setup')
+    def check_exclusive(self):
+        # the cgroup of a job on a shared node limits the memory hog, and thus increases the data to write
+        self.skip_if(self.memory_sizing and not self.exclusive_access,
+                     'memory sizing needs exclusive nodes, set exclusive_access=true or memory_sizing=false')
+
+    def memory_cmds(self):
+        """
+        shell commands that set the memory hogged by the read test in IOR_HOG, and the memory of the node that
+        remains available for page cache while reading in IOR_CACHEABLE
+        the read test hogs the memory of the job (cgroup memory limit) minus memory_reserve, at most memory_hog_max %
+        of the node. The page cache is not limited to the memory of the job: it can keep the pages of the write job.
+        with memory sizing, the job exits if it can hog less than memory_hog_min % of the node
+        """
+        hog_reserve = size_bytes(self.memory_reserve)
+        cmds = [
+            "MEM_NODE=$(( $(awk '/^MemTotal:/ {print $2}' /proc/meminfo) * 1024 ))",
+            'MEM_JOB=$MEM_NODE',
+            'path_v2=/sys/fs/cgroup/$(</proc/self/cpuset)/../../../memory.max',
+            'path_v1=/sys/fs/cgroup/memory/$(</proc/self/cpuset)/../memory.limit_in_bytes',
+            'for path in $path_v2 $path_v1; do',
+            '    [[ -f $path && $(<$path) =~ ^[0-9]+$ ]] && (( $(<$path) < MEM_JOB )) && MEM_JOB=$(<$path)',
+            'done',
+            f'IOR_HOG=$(( MEM_JOB - {hog_reserve} ))',
+            f'IOR_HOG_MAX=$(( MEM_NODE * {self.memory_hog_max} / 100 ))',
+            '(( IOR_HOG > IOR_HOG_MAX )) && IOR_HOG=$IOR_HOG_MAX',
+            '(( IOR_HOG < 0 )) && IOR_HOG=0',
+            'IOR_CACHEABLE=$(( MEM_NODE - IOR_HOG ))',
+        ]
+        if self.memory_sizing:
+            cmds += [
+                f'if (( IOR_HOG < MEM_NODE * {self.memory_hog_min} / 100 )); then',
+                '    echo "ERROR: the job can hog $IOR_HOG of $MEM_NODE bytes, request all memory of the node" >&2',
+                '    exit 1',
+                'fi',
+            ]
+        return cmds
+
+    def segment_cmds(self):
+        """
+        shell commands that set the segment count in IOR_SEGMENTS
+        with memory sizing, IOR_EXCEEDS_CACHE is 0 if total_transfers caps the data below the cacheable memory
+        """
+        if not self.memory_sizing:
+            return [f'IOR_SEGMENTS={self.segment_count}']
+        # the smallest number of segments that exceeds the cacheable memory of each node by cache_margin
+        chunk = self.num_tasks_per_node * self.block_bytes
+        return [
+            f'IOR_SEGMENTS=$(( ({int(100 * self.cache_margin)} * IOR_CACHEABLE / 100 + {chunk} - 1) / {chunk} ))',
+            'IOR_EXCEEDS_CACHE=1',
+            f'if (( IOR_SEGMENTS > {self.segment_count} )); then',
+            f'    IOR_SEGMENTS={self.segment_count}',
+            f'    (( IOR_SEGMENTS * {chunk} > IOR_CACHEABLE )) || IOR_EXCEEDS_CACHE=0',
+            'fi',
+            '(( IOR_SEGMENTS < 1 )) && IOR_SEGMENTS=1',
+        ]
+
+    @run_before('run')
+    def set_sizing_cmds(self):
+        self.prerun_cmds += self.memory_cmds() + self.segment_cmds() + [
+            f'echo "IOR sizes: segments=$IOR_SEGMENTS block={self.block_bytes} tasks={self.num_tasks} '
+            f'hog=$IOR_HOG cacheable=$IOR_CACHEABLE exceeds_cache=$IOR_EXCEEDS_CACHE"',
+        ]
+
+    def ior_opts(self, summary_file):
+        "return list of the IOR options of the configuration of the test"
+        opts = [
             '-o', self.testfile,
-            '-t', '4m',
-            '-b', '64m', '-s', '256',
-            '-D', '120',
-            '-F', '-C', '-e', '-v', '-q',
+            '-t', self.transfer_size,
+            '-b', str(self.block_bytes), '-s', '$IOR_SEGMENTS',
+            *([] if self.memory_sizing else ['-D', '120']),
+            '-C', '-e', '-q',
+            '-O', 'summaryFormat=JSON', '-O', f'summaryFile={summary_file}',
         ]
-        self.num_tasks_per_node = self.num_tasks
+        if self.file_per_process:
+            opts.append('-F')
+        if self.random_offset:
+            opts.append('-z')
+        return opts
+
+    @run_before('run')
+    def set_executable_opts(self):
+        self.executable_opts = self.ior_opts(self.summary_file)
+        if self.hog_memory and self.memory_sizing:
+            self.executable_opts.extend(['-M', '$IOR_HOG'])
+        self.executable_opts.extend(self.operation_opts)
+
+    @run_before('sanity')
+    def read_summary(self):
+        self.summary, self.iterations = read_ior_summary(os.path.join(self.stagedir, self.summary_file), self.operation)
 
     @sanity_function
     def assert_run(self):
-        return sn.assert_found(r'^Finished', self.stdout)
+        checks = [
+            sn.assert_true(self.summary, msg=f'no {self.operation} summary in {self.summary_file}'),
+            sn.assert_true(self.iterations, msg=f'no {self.operation} results in {self.summary_file}'),
+        ]
+        if self.hog_memory and self.memory_sizing:
+            checks.append(sn.assert_gt(self.data_bytes(), self.ior_size('cacheable'),
+                                       msg='the data does not exceed the memory available for page cache'))
+        return sn.all(checks)
 
+    def iterations_mean(self, key):
+        return statistics.mean(x[key] for x in self.iterations)
+
+    # total bandwidth: all MPI processes combined
     @performance_function('MiB/s', perf_key='bandwith')
     def bandwidth(self):
-        # total bandwidth: all MPI processes combined
-        return sn.extractsingle(r'^Max\s+\S+\s+(\S+)\s+MiB/sec.*', self.stdout, 1, float)
+        return self.summary['bwMaxMIB']
+
+    @performance_function('MiB/s', perf_key='bandwidth_min')
+    def bandwidth_min(self):
+        return self.summary['bwMinMIB']
+
+    @performance_function('MiB/s', perf_key='bandwidth_mean')
+    def bandwidth_mean(self):
+        return self.summary['bwMeanMIB']
+
+    @performance_function('MiB/s', perf_key='bandwidth_stddev')
+    def bandwidth_stddev(self):
+        return self.summary['bwStdMIB']
+
+    @performance_function('IOPS', perf_key='iops')
+    def iops(self):
+        return self.summary['OPsMax']
+
+    @performance_function('IOPS', perf_key='iops_mean')
+    def iops_mean(self):
+        return self.summary['OPsMean']
+
+    @performance_function('s', perf_key='latency')
+    def latency(self):
+        "mean latency of a transfer"
+        return self.iterations_mean('latency')
+
+    @performance_function('s', perf_key='open_time')
+    def open_time(self):
+        return self.iterations_mean('openTime')
+
+    @performance_function('s', perf_key='wrrd_time')
+    def wrrd_time(self):
+        "time of the write or read phase"
+        return self.iterations_mean('wrRdTime')
+
+    @performance_function('s', perf_key='close_time')
+    def close_time(self):
+        return self.iterations_mean('closeTime')
+
+    def ior_size(self, key):
+        return sn.extractsingle(rf'^IOR sizes: .*\b{key}=(\d+)', self.stdout, 1, int)
+
+    @performance_function('', perf_key='segment_count')
+    def segment_count_used(self):
+        return self.ior_size('segments')
+
+    @performance_function('B', perf_key='block_size')
+    def block_size_used(self):
+        return self.ior_size('block')
+
+    def data_bytes(self):
+        "data written or read by all tasks"
+        return self.ior_size('segments') * self.ior_size('block') * self.ior_size('tasks')
+
+    @performance_function('B', perf_key='data_size')
+    def data_size(self):
+        return self.data_bytes()
+
+    @performance_function('B', perf_key='memory_hog')
+    def memory_hog(self):
+        "memory of the node hogged by the read test (-M)"
+        return self.ior_size('hog')
+
+    @performance_function('', perf_key='cache_ratio')
+    def cache_ratio(self):
+        "data divided by the memory of the node available for page cache, the read test is cached below 1"
+        return self.data_bytes() / self.ior_size('cacheable')
+
+    @require_deps
+    def set_executable(self, iorBuildTest):
+        builddir = os.path.join(iorBuildTest().build_prefix, 'src')
+        self.executable = os.path.join(builddir, self.exe)
+
+
+class iorSweepBase(iorTestBase):
+    "sweep over transfer size, shared file or file per process, and sequential or random offsets"
+    transfer_size = parameter(['4k', '64k', '4m'])
+    file_per_process = parameter([True, False])
+    random_offset = parameter([False, True])
+
+    @run_after('init')
+    def set_descr(self):
+        self.descr += f' ({self.test_label()})'
 
 
 @rfm.simple_test
-class iorWriteTest(iorTestBase):
-    descr = 'ior storage sequential write correctness and performance test'
+class iorWriteTest(iorSweepBase):
+    descr = 'ior storage write correctness and performance test'
+    operation = 'write'
+    operation_opts = ['-w', '-W', '-k']
 
     @run_after('init')
     def post_init(self):
         self.depends_on('iorBuildTest')
-        self.executable_opts.extend(['-w', '-W', '-k'])
         self.prerun_cmds = [
             f'rm -f {self.testfile}*',
             f'mkdir -p {os.path.dirname(self.testfile)}',
         ]
 
-    @require_deps
-    def set_executable(self, iorBuildTest):
-        builddir = os.path.join(iorBuildTest().stagedir, src_dir, 'src')
-        self.executable = os.path.join(builddir, self.exe)
+    @run_before('run', always_last=True)
+    def save_sizes(self):
+        sizes_file = os.path.join(os.path.dirname(self.testfile), self.sizes_file)
+        self.prerun_cmds.append(
+            f'printf "IOR_SEGMENTS=%s\\nIOR_EXCEEDS_CACHE=%s\\n" "$IOR_SEGMENTS" "$IOR_EXCEEDS_CACHE" > {sizes_file}'
+        )
 
 
 @rfm.simple_test
-class iorReadTest(iorTestBase):
-    descr = 'ior storage sequential read performance test'
+class iorReadTest(iorSweepBase):
+    descr = 'ior storage read performance test'
+    operation = 'read'
+    operation_opts = ['-r']
+    hog_memory = True
+
+    def segment_cmds(self):
+        "read the segment count of the write test"
+        return [f'source {os.path.join(os.path.dirname(self.testfile), self.sizes_file)}']
+
+    @run_after('setup')
+    def skip_cached(self):
+        "skip the test if total_transfers capped the data of the write test below the page cache of the node"
+        sizes_file = os.path.join(os.path.dirname(self.testfile), self.sizes_file)
+        if not self.memory_sizing or not os.path.isfile(sizes_file):
+            return
+        with open(sizes_file, encoding='utf-8') as f:
+            sizes = dict(x.strip().split('=', 1) for x in f if '=' in x)
+        if sizes.get('IOR_EXCEEDS_CACHE') == '0':
+            shutil.rmtree(os.path.dirname(self.testfile), ignore_errors=True)
+            self.skip(f'{self.total_transfers} transfers of {self.transfer_size} do not exceed the page cache')
 
     @run_after('init')
     def post_init(self):
-        self.depends_on('iorWriteTest')
+        # read the files written by the write test with the same configuration
+        variant = iorWriteTest.get_variant_nums(
+            transfer_size=self.transfer_size,
+            file_per_process=self.file_per_process,
+            random_offset=self.random_offset,
+        )
+        self.depends_on(iorWriteTest.variant_name(variant[0]))
         self.depends_on('iorBuildTest')
-        self.executable_opts.extend(['-r'])
         self.postrun_cmds = [
             f'rm -rf {os.path.dirname(self.testfile)}',
             'path_v2=/sys/fs/cgroup/$(</proc/self/cpuset)/../../../memory.peak',
@@ -122,26 +412,262 @@ class iorReadTest(iorTestBase):
             'echo "MAX_MEM_IN_MIB=$(($MAX_MEM_IN_BYTES/1048576))"',
         ]
 
+
+class iorStepsTestBase(iorTestBase):
+    """
+    base class for ior tests that run several IOR steps (write or read) as job steps of a single job
+    subclasses set job_steps before the run stage
+    """
+    # list of tuples of the name, operation, launcher options and IOR options of each step
+    job_steps = variable(list)
+    # performance variables of the base class that apply to all steps
+    sizing_perf_variables = ['segment_count', 'block_size', 'data_size', 'memory_hog', 'cache_ratio']
+
+    def step_summary(self, name):
+        return f'ior_{name}.json'
+
+    def read_opts(self):
+        return (['-M', '$IOR_HOG'] if self.memory_sizing else []) + ['-r']
+
+    @run_after('init')
+    def post_init(self):
+        self.depends_on('iorBuildTest')
+        self.keep_files = [self.step_summary('*')]
+
+    @run_before('run', always_last=True)
+    def set_job_steps(self):
+        "run the steps as job steps, the main command only runs locally"
+        launcher = self.job.launcher.run_command(self.job)
+        self.job.launcher = getlauncher('local')()
+        ior = self.executable
+        self.executable = 'echo'
+        self.executable_opts = ['ior steps finished']
+        self.prerun_cmds += [
+            f'rm -f {self.testfile}*',
+            f'mkdir -p {os.path.dirname(self.testfile)}',
+        ]
+        for name, operation, launcher_opts, opts in self.job_steps:
+            self.prerun_cmds.append(
+                ' '.join([launcher, *launcher_opts, ior, *self.ior_opts(self.step_summary(name)), *opts])
+            )
+            if operation == 'read':
+                self.prerun_cmds.append(f'rm -f {self.testfile}*')
+        self.postrun_cmds = [f'rm -rf {os.path.dirname(self.testfile)}']
+
+    @run_before('sanity')
+    def read_summary(self):
+        self.summaries = {
+            name: read_ior_summary(os.path.join(self.stagedir, self.step_summary(name)), operation)[0]
+            for name, operation, _, _ in self.job_steps
+        }
+
+    @run_before('performance')
+    def keep_sizing_perf_variables(self):
+        "drop the performance variables of a single IOR run, subclasses add those of the steps"
+        self.perf_variables = {k: v for k, v in self.perf_variables.items() if k in self.sizing_perf_variables}
+
+    @sanity_function
+    def assert_run(self):
+        checks = [sn.assert_found('ior steps finished', self.stdout)] + [
+            sn.assert_true(summary, msg=f'no summary of step {name}') for name, summary in self.summaries.items()
+        ]
+        if self.memory_sizing:
+            checks.append(sn.assert_found(r'^IOR sizes: .*\bexceeds_cache=1', self.stdout,
+                                          msg='total_transfers caps the data below the page cache'))
+        return sn.all(checks)
+
+
+@rfm.simple_test
+class iorScalingTest(iorStepsTestBase):
+    """
+    ior client scaling test
+    writes and reads with tasks_per_node tasks on 1, 2, 4, ... nodes up to max_nodes, as job steps of a single job
+    the amount of data per node is the same for all node counts, and -C makes each node read the data of another node
+    reports the aggregate bandwidth, the bandwidth per node and the scaling efficiency relative to 1 node
+    """
+    descr = 'ior storage client scaling test'
+    num_tasks = 0
+    time_limit = '2h'
+    transfer_size = variable(str, value='4m')
+    file_per_process = variable(typ.Bool, value=True)
+    random_offset = variable(typ.Bool, value=False)
+    tasks_per_node = variable(int, value=4)
+    # maximum number of nodes, 0 to use the 'max_nodes' extra of the partition (default 2)
+    max_nodes = variable(int, value=0)
+
+    def test_label(self):
+        return f'scaling-{super().test_label()}'
+
+    @run_after('setup')
+    def set_sizes(self):
+        max_nodes = self.max_nodes or self.current_partition.extras.get('max_nodes', 2)
+        self.node_counts = [1 << i for i in range(max_nodes.bit_length()) if 1 << i < max_nodes] + [max_nodes]
+        self.num_tasks_per_node = self.tasks_per_node
+        self.num_tasks = max_nodes * self.tasks_per_node
+        super().set_sizes()
+
+    @run_after('setup')
+    def set_steps(self):
+        self.job_steps = []
+        for n in self.node_counts:
+            launcher_opts = [f'--nodes={n}', f'--ntasks={n * self.tasks_per_node}',
+                             f'--ntasks-per-node={self.tasks_per_node}']
+            self.job_steps += [
+                (f'write_nodes{n}', 'write', launcher_opts, ['-w', '-k']),
+                (f'read_nodes{n}', 'read', launcher_opts, self.read_opts()),
+            ]
+
+    @run_before('performance')
+    def set_perf_variables(self):
+        for op in ['write', 'read']:
+            base = self.summaries[f'{op}_nodes1']['bwMaxMIB']
+            for n in self.node_counts:
+                bandwidth = self.summaries[f'{op}_nodes{n}']['bwMaxMIB']
+                self.perf_variables.update({
+                    f'{op}_bandwidth_nodes{n}': sn.make_performance_function(sn.defer(bandwidth), 'MiB/s'),
+                    f'{op}_bandwidth_per_node_nodes{n}': sn.make_performance_function(
+                        sn.defer(bandwidth / n), 'MiB/s'
+                    ),
+                    f'{op}_efficiency_nodes{n}': sn.make_performance_function(
+                        sn.defer(100 * bandwidth / (n * base)), '%'
+                    ),
+                })
+
+
+@rfm.simple_test
+class iorAPITest(iorStepsTestBase):
+    """
+    ior I/O API comparison test
+    writes and reads the same shared file through POSIX, independent MPI-IO and collective MPI-IO (-c), as job steps
+    of a single job, to tell regressions of the file system from regressions of the MPI-IO stack
+    """
+    descr = 'ior storage I/O API comparison test'
+    time_limit = '2h'
+    transfer_size = variable(str, value='1m')
+    file_per_process = False
+    random_offset = False
+    # path of a ROMIO hints file for the MPI-IO steps, empty for no hints
+    hints_file = variable(str, value='')
+
+    apis = {
+        'posix': ['-a', 'POSIX'],
+        'mpiio': ['-a', 'MPIIO'],
+        'mpiio_collective': ['-a', 'MPIIO', '-c'],
+    }
+
+    def test_label(self):
+        return f'api-{super().test_label()}'
+
+    @run_after('setup')
+    def set_steps(self):
+        self.job_steps = []
+        for api, opts in self.apis.items():
+            if self.hints_file and api.startswith('mpiio'):
+                opts = opts + ['-U', self.hints_file]
+            self.job_steps += [
+                (f'{api}_write', 'write', [], opts + ['-w', '-k']),
+                (f'{api}_read', 'read', [], opts + self.read_opts()),
+            ]
+
+    @run_before('performance')
+    def set_perf_variables(self):
+        self.perf_variables.update({
+            f'{name}_bandwidth': sn.make_performance_function(sn.defer(summary['bwMaxMIB']), 'MiB/s')
+            for name, summary in self.summaries.items()
+        })
+
+
+"""
+mdtest metadata tests
+options:
+-d <path/to/dir>  -- directory of the test tree
+-n 1000  -- number of files and directories per task
+-u  -- unique working directory for each task, instead of a shared directory for all tasks
+-w 4096  -- bytes to write to each file after it is created
+-e 4096  -- bytes to read from each file
+-i 1  -- number of iterations
+"""
+
+
+@rfm.simple_test
+class mdtestTest(rfm.RunOnlyRegressionTest, ReferenceMixin):
+    descr = 'mdtest storage metadata performance test'
+    valid_systems = required
+    valid_prog_environs = required
+    time_limit = '10m'
+    exe = 'mdtest'
+    num_tasks = required
+    num_cpus_per_task = 1  # mdtest uses MPI
+    exclusive_access = required
+    unique_dir = parameter([True, False])
+    files_per_task = parameter([100, 1000, 10000])
+
+    # operations in the rate summary of mdtest
+    operations = [
+        'Directory creation', 'Directory stat', 'Directory removal',
+        'File creation', 'File stat', 'File read', 'File removal',
+    ]
+
+    @run_after('init')
+    def post_init(self):
+        self.depends_on('iorBuildTest')
+        layout = 'unique' if self.unique_dir else 'shared'
+        self.descr += f' ({self.files_per_task} files per task in {layout} directories)'
+        self.testdir = os.path.join(iorTestBase.scratch_dir, f'mdtest-{self.files_per_task}-{layout}')
+        self.num_tasks_per_node = self.num_tasks
+        self.executable_opts = [
+            '-d', self.testdir,
+            '-n', str(self.files_per_task),
+            '-w', '4096', '-e', '4096',
+            '-i', '1',
+        ]
+        if self.unique_dir:
+            self.executable_opts.append('-u')
+        self.prerun_cmds = [
+            f'rm -rf {self.testdir}',
+            f'mkdir -p {self.testdir}',
+        ]
+        self.postrun_cmds = [f'rm -rf {self.testdir}']
+
     @require_deps
     def set_executable(self, iorBuildTest):
-        builddir = os.path.join(iorBuildTest().stagedir, src_dir, 'src')
+        builddir = os.path.join(iorBuildTest().build_prefix, 'src')
         self.executable = os.path.join(builddir, self.exe)
 
+    @run_before('performance')
+    def set_perf_variables(self):
+        "mean rate of each operation in ops/s"
+        self.perf_variables = {
+            op.lower().replace(' ', '_'): sn.make_performance_function(
+                sn.extractsingle(rf'^\s*{op}\s+:\s+\S+\s+\S+\s+(\S+)', self.stdout, 1, float), 'ops/s'
+            )
+            for op in self.operations
+        }
+
+    @sanity_function
+    def assert_run(self):
+        return sn.assert_found(r'^-- finished', self.stdout)
+
 
 @rfm.simple_test
-class iorBuildTest(rfm.CompileOnlyRegressionTest):
+class iorBuildTest(rfm.CompileOnlyRegressionTest, BuildCacheMixin):
     descr = 'ior build test'
     valid_systems = required
     valid_prog_environs = required
     sourcesdir = None
     prebuild_cmds = [
-        download_cmd if not os.path.isfile(src_path) else '',
         extract_cmd,
         './bootstrap',
     ]
     build_locally = False
     build_system = 'Autotools'
     num_cpus_per_task = required
+    build_cache_sources = [src_dir]
+    build_cache_tree = src_dir
+
+    @run_after('setup')
+    def fetch_sources(self):
+        sources.fetch(src_dir)
 
     @run_after('setup')
     def set_resources(self):
@@ -0,0 +1 @@
+"shared helpers for the VUB-HPC ReFrame tests"
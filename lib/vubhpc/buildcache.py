@@ -0,0 +1,127 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+
+import reframe as rfm
+import reframe.core.runtime as rt
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_before, variable
+
+from vubhpc import sources
+
+default_cache = os.getenv('REFRAME_BUILDCACHE', os.path.join(os.getenv('RFM_PREFIX', os.curdir), 'buildcache'))
+
+# entries of valid_systems and valid_prog_environs that sysenv_combinations understands
+NAME_PATTERN = re.compile(r'^(\*|\w[\w.-]*)(:(\*|\w[\w.-]*))?$')
+
+
+def sysenv_combinations(valid_systems, valid_prog_environs):
+    """
+    return list of the partitions and programming environments of the current system that match valid_systems and
+    valid_prog_environs, None if they contain features or other entries than names and '*'
+    """
+    if not all(NAME_PATTERN.match(x) for x in [*valid_systems, *valid_prog_environs]):
+        return None
+
+    system = rt.runtime().system
+
+    def valid_partition(partition, entry):
+        sysname, _, partname = entry.partition(':')
+        return sysname in ['*', system.name] and partname in ['', '*', partition.name]
+
+    return [
+        (partition, environ)
+        for partition in system.partitions if any(valid_partition(partition, x) for x in valid_systems)
+        for environ in partition.environs if any(x in ['*', environ.name] for x in valid_prog_environs)
+    ]
+
+
+class BuildCacheMixin(rfm.RegressionMixin):
+    """
+    reuse the build tree of a CompileOnlyRegressionTest across sessions
+    the cache key is made of the checksums of the source archives and of the file of the test (with its build
+    options), the build_cache_variables and prebuild commands, the modules and compilers of the programming
+    environment, and the CPU architecture of the partition
+    the key is known before the setup stage: if the cache has a build for every partition and programming environment
+    of the test, the build is local and does nothing, and build_prefix points to the cached build tree
+    on a cache miss, the test is built as usual and the build tree is copied to the cache afterwards
+    """
+    # directory of the build cache, empty string to disable
+    build_cache = variable(str, value=default_cache)
+    # names of the source archives (see vubhpc.sources) to include in the cache key
+    build_cache_sources = variable(typ.List[str], value=[])
+    # directory in the stage dir with the build tree to cache
+    build_cache_tree = variable(str, value='')
+    # variables of the test that change the result of the build
+    build_cache_variables = variable(typ.List[str], value=[])
+
+    def build_cache_test_key(self):
+        "return dict with the items of the cache key independent of the partition, None if a source is missing"
+        checksums = {x: sources.checksum(x) for x in self.build_cache_sources}
+        if None in checksums.values():
+            return None
+
+        return {
+            'test': type(self).__name__,
+            'test_file': sources.sha256sum(inspect.getfile(type(self))),
+            'sources': checksums,
+            'variables': {x: getattr(self, x) for x in self.build_cache_variables},
+            'prebuild_cmds': self.prebuild_cmds,
+        }
+
+    def build_cache_entry(self, partition, environ):
+        "return the directory of the cached build in partition and environ, and the JSON of its key"
+        key = {
+            **self.build_cache_key,
+            'environ': {
+                'name': environ.name,
+                'modules': environ.modules,
+                'compilers': [environ.cc, environ.cxx, environ.ftn],
+                'flags': [environ.cppflags, environ.cflags, environ.cxxflags, environ.fflags, environ.ldflags],
+            },
+            'arch': partition.processor.arch or partition.fullname,
+        }
+        key_json = json.dumps(key, sort_keys=True, default=list)
+        key_hash = hashlib.sha256(key_json.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.build_cache, type(self).__name__, key_hash), key_json
+
+    @run_before('setup')
+    def check_build_cache(self):
+        self.build_cache_key = self.build_cache_test_key() if self.build_cache else None
+        if self.build_cache_key is None:
+            return
+
+        combinations = sysenv_combinations(self.valid_systems, self.valid_prog_environs)
+        if combinations and all(os.path.isdir(self.build_cache_entry(*x)[0]) for x in combinations):
+            # every build is cached: do not submit build jobs that do nothing
+            self.build_locally = True
+
+    @run_before('compile', always_last=True)
+    def use_build_cache(self):
+        self.build_prefix = os.path.join(self.stagedir, self.build_cache_tree)
+        if self.build_cache_key is None:
+            return
+
+        cache_prefix, key_json = self.build_cache_entry(self.current_partition, self.current_environ)
+
+        if os.path.isdir(cache_prefix):
+            self.build_prefix = cache_prefix
+            self.prebuild_cmds = []
+            self.postbuild_cmds = []
+            self.build_system = 'CustomBuild'
+            self.build_system.commands = [f'echo "using cached build {cache_prefix}"']
+            return
+
+        with open(os.path.join(self.stagedir, 'buildcache_key.json'), 'w', encoding='utf-8') as keyfile:
+            keyfile.write(key_json)
+
+        # copy to a temporary directory and rename, so concurrent sessions never see a partial build tree
+        cache_dir, key_hash = os.path.split(cache_prefix)
+        self.postbuild_cmds += [
+            f'mkdir -p {cache_dir}',
+            f'tmpdir=$(mktemp -d {cache_dir}/.{key_hash}.XXXXXX)',
+            f'cp -a {self.build_prefix}/. {self.stagedir}/buildcache_key.json $tmpdir',
+            f'mv -T $tmpdir {cache_prefix} || rm -rf $tmpdir',
+        ]
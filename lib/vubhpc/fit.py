@@ -0,0 +1,35 @@
+"""
+least-squares fits of performance models to benchmark curves
+
+plain Python (no numpy), so that the fits can run inside ReFrame hooks on any system
+"""
+
+import math
+
+
+def linear_fit(xs, ys, weights=None):
+    """
+    weighted least-squares fit of y = a + b * x
+    return tuple (a, b)
+    """
+    if weights is None:
+        weights = [1.0] * len(xs)
+    if len(xs) < 2 or len(xs) != len(ys) or len(xs) != len(weights):
+        raise ValueError('linear fit needs at least 2 points and as many x, y values and weights')
+
+    sw = sum(weights)
+    mx = sum(w * x for w, x in zip(weights, xs)) / sw
+    my = sum(w * y for w, y in zip(weights, ys)) / sw
+    sxx = sum(w * (x - mx) ** 2 for w, x in zip(weights, xs))
+    sxy = sum(w * (x - mx) * (y - my) for w, x, y in zip(weights, xs, ys))
+    if sxx == 0:
+        raise ValueError('linear fit needs at least 2 distinct x values')
+
+    b = sxy / sxx
+    return my - b * mx, b
+
+
+def relative_residual(ys, fitted):
+    "root mean square of the relative residuals (fitted - y) / y, in %"
+    terms = [((f - y) / y) ** 2 for y, f in zip(ys, fitted) if y]
+    return 100 * math.sqrt(sum(terms) / len(terms)) if terms else 0.0
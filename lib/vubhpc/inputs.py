@@ -0,0 +1,75 @@
+"""
+cache of input files extracted from source archives
+
+prepare() extracts members of a source archive (see vubhpc.sources) once, into a cache directory indexed by the
+checksum of the archive and the path of the member in the archive, and returns the paths of the cached files.
+Tests copy or link the cached files into their stage directory instead of extracting the archive in every job.
+"""
+
+import fcntl
+import os
+import tarfile
+import zipfile
+
+from vubhpc import sources
+
+default_cache = os.getenv('REFRAME_INPUTCACHE', os.path.join(os.getenv('RFM_PREFIX', os.curdir), 'inputcache'))
+
+
+def _extract(path, members, cachedir):
+    "extract members of archive path into cachedir in a single pass over the archive"
+    todo = set(members)
+
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            missing = sorted(todo - set(archive.namelist()))
+            if missing:
+                raise sources.SourceError(f'members not found in {path}: {", ".join(missing)}')
+            for member in members:
+                with archive.open(member) as src, open(os.path.join(cachedir, member) + '.part', 'wb') as dst:
+                    dst.write(src.read())
+                todo.discard(member)
+    else:
+        # stream the archive: compressed tar archives cannot be searched without decompressing them
+        with tarfile.open(path, 'r|*') as archive:
+            for tarinfo in archive:
+                if tarinfo.name not in todo:
+                    continue
+                with archive.extractfile(tarinfo) as src, open(os.path.join(cachedir, tarinfo.name) + '.part',
+                                                               'wb') as dst:
+                    dst.write(src.read())
+                todo.discard(tarinfo.name)
+                if not todo:
+                    break
+
+    if todo:
+        raise sources.SourceError(f'members not found in {path}: {", ".join(sorted(todo))}')
+
+    for member in members:
+        target = os.path.join(cachedir, member)
+        os.replace(target + '.part', target)
+
+
+def prepare(name, members, cache=default_cache):
+    "return dict of member and path of the cached copy of each member of source archive name"
+    path = sources.fetch(name)
+    cachedir = os.path.join(cache, sources.checksum(name))
+    cached = {x: os.path.join(cachedir, x) for x in members}
+
+    missing = [x for x in members if not os.path.isfile(cached[x])]
+    if not missing:
+        return cached
+
+    os.makedirs(cachedir, exist_ok=True)
+    with open(os.path.join(cachedir, '.lock'), 'w', encoding='utf-8') as lockfile:
+        fcntl.flock(lockfile, fcntl.LOCK_EX)
+        try:
+            missing = [x for x in members if not os.path.isfile(cached[x])]
+            for member in missing:
+                os.makedirs(os.path.dirname(cached[member]), exist_ok=True)
+            if missing:
+                _extract(path, missing, cachedir)
+        finally:
+            fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    return cached
@@ -0,0 +1,124 @@
+"""
+performance of the individual nodes, from the node lists of the records in the perflog store
+
+the perflog records contain the nodes of the job of each test (nodelist, see perf_logging_format in
+config/config.py); a value is compared with the median of all values of the same test, partition, programming
+environment and performance variable, its relative deviation is signed so that negative is worse (see
+direction() in vubhpc.perflogs) and counts for each node of the job; variables without direction are skipped
+fingerprint of a node: median deviation of the node per test, partition, programming environment and performance
+variable; score of a node: median of its fingerprint
+nodes with a score below -threshold (and at least min_values values) are on the drain list:
+    python3 -m vubhpc.nodeperf --since 30 --drain-list drain.txt
+
+by default only records of single-node jobs are used, a slow node in a multi-node job also slows down the other
+nodes of the job
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import json
+import os
+import statistics
+import sys
+
+from vubhpc import perfstore
+from vubhpc.perflogs import direction
+
+GROUP_FIELDS = ['name', 'system', 'partition', 'environ', 'perf_var', 'unit']
+
+
+def node_deviations(rows, names, max_nodes=1, min_records=5):
+    """
+    return dict of the deviations of each node, per group of GROUP_FIELDS (as 'system:partition+environ name perf_var')
+    rows and names: result of perfstore.query, records without node list or with more than max_nodes nodes are skipped
+    groups with less than min_records records or with a median that is not positive are skipped
+    """
+    index = {x: names.index(x) for x in [*GROUP_FIELDS, 'perf_value', 'nodelist']}
+    groups = {}
+    for row in rows:
+        nodes = (row[index['nodelist']] or '').split(',')
+        if not nodes[0] or len(nodes) > max_nodes:
+            continue
+        key = tuple(row[index[x]] for x in GROUP_FIELDS)
+        groups.setdefault(key, []).append((row[index['perf_value']], nodes))
+
+    deviations = {}
+    for (name, system, partition, environ, perf_var, unit), records in groups.items():
+        if len(records) < min_records:
+            continue
+        sign = direction(perf_var, unit)
+        median = statistics.median(value for value, _ in records)
+        if median <= 0 or not sign:
+            continue
+        for value, nodes in records:
+            for node in nodes:
+                group = f'{system}:{partition}+{environ} {name} {perf_var}'
+                deviations.setdefault(node, {}).setdefault(group, []).append(sign * (value / median - 1))
+    return deviations
+
+
+def rank_nodes(deviations):
+    """
+    return list of dicts with the node, score, worst group and its deviation, number of values and fingerprint of
+    each node, in order of score (worst first)
+    """
+    ranking = []
+    for node, groups in deviations.items():
+        fingerprint = {group: statistics.median(values) for group, values in groups.items()}
+        worst = min(fingerprint, key=fingerprint.get)
+        ranking.append({
+            'node': node,
+            'score': statistics.median(fingerprint.values()),
+            'worst': worst,
+            'worst_deviation': fingerprint[worst],
+            'values': sum(len(x) for x in groups.values()),
+            'fingerprint': fingerprint,
+        })
+    return sorted(ranking, key=lambda x: (x['score'], x['worst_deviation']))
+
+
+def main():
+    parser = ArgumentParser(description='rank the nodes by the deviation of their performance from their partition')
+    parser.add_argument('--perflog-dir', default=os.getenv('RFM_PERFLOG_DIR', 'perflogs'),
+                        help='directory of the perflogs (default: RFM_PERFLOG_DIR)')
+    parser.add_argument('--store', help=f'path of the store (default: {perfstore.STORE_NAME} in the perflog directory)')
+    parser.add_argument('--since', type=float, default=30, help='days of records to use')
+    for field in ['name', 'system', 'partition', 'environ', 'perf_var']:
+        parser.add_argument(f'--{field.replace("_", "-")}', help=f'glob pattern of the {field} of the records')
+    parser.add_argument('--max-nodes', type=int, default=1, help='maximum number of nodes of the job of a record')
+    parser.add_argument('--min-records', type=int, default=5,
+                        help='minimum number of records of a test and performance variable in a partition')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative deviation of the score of a slow node')
+    parser.add_argument('--min-values', type=int, default=3, help='minimum number of values of a slow node')
+    parser.add_argument('--top', type=int, default=20, help='number of nodes to print, 0 for all')
+    parser.add_argument('--drain-list', help='write the slow nodes to this file, one per line')
+    parser.add_argument('--json', help='also write the ranking with the fingerprints to this JSON file')
+    args = parser.parse_args()
+
+    store = args.store or perfstore.store_path(args.perflog_dir)
+    perfstore.ingest(args.perflog_dir, store)
+
+    since = (datetime.now() - timedelta(days=args.since)).strftime('%Y-%m-%dT%H:%M:%S')
+    filters = {x: getattr(args, x) for x in ['name', 'system', 'partition', 'environ', 'perf_var']}
+    names, rows = perfstore.query(store, filters, since)
+    ranking = rank_nodes(node_deviations(rows, names, args.max_nodes, args.min_records))
+    slow = [x['node'] for x in ranking if x['score'] <= -args.threshold and x['values'] >= args.min_values]
+
+    print(f'{len(ranking)} nodes in {len(rows)} performance records since {since}')
+    print('node score values worst')
+    for x in ranking[:args.top or None]:
+        print(f'{x["node"]} {100 * x["score"]:+.1f}% {x["values"]} {x["worst"]} {100 * x["worst_deviation"]:+.1f}%')
+    print(f'slow nodes: {",".join(slow)}')
+
+    if args.drain_list:
+        with open(args.drain_list, 'w', encoding='utf-8') as f:
+            f.writelines(f'{node}\n' for node in slow)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(ranking, f, indent=1)
+
+    sys.exit(1 if slow else 0)
+
+
+if __name__ == '__main__':
+    main()
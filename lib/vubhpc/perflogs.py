@@ -0,0 +1,302 @@
+"""
+regression detection over the performance logs of ReFrame
+
+reads the perflogs written by the 'filelog' handler in config/config.py (RFM_PERFLOG_DIR/<system>/<partition>/*.log),
+including the perflogs that ReFrame renamed to *.log.h<n> when the format of their records changed,
+groups the performance values by test name, system, partition, programming environment and performance variable,
+and compares the recent values (of the last `--since` days) of each group with the baseline of the values before
+them: the median of the previous `--window` values, with a noise band of `--threshold` times their median absolute
+deviation (scaled to the standard deviation of normal noise). Also reports the largest shift of the mean in the
+history of each group (change point), if it is significant.
+
+the records of each file are extracted with a single regular expression, and the statistics are computed with NumPy
+on arrays of all records at once, so that years of history are analysed in seconds:
+    python3 -m vubhpc.perflogs --since 7
+
+NumPy is not a dependency of ReFrame, load it first (e.g. the SciPy-bundle module of the ReFrame toolchain)
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from fnmatch import fnmatch
+import glob
+import json
+import os
+import re
+import sys
+
+# values of these units are better when lower, values of all other units are better when higher
+LOWER_IS_BETTER_UNITS = ['s', 'ms', 'us', 'ns']
+
+# performance variables (glob patterns) that are better when lower, whatever their unit
+LOWER_IS_BETTER_VARS = [
+    'serial_fraction', 'fit_residual', 'latency_growth_*', 'bandwidth_stddev', 'size_half_bandwidth', 'outlier_*',
+]
+
+# performance variables (glob patterns) that report the sizes a test chose at run time rather than its performance:
+# they have no direction, no reference and are never a regression
+CONFIG_VARS = ['data_size', 'segment_count', 'block_size', 'memory_hog', 'cache_ratio', 'size_peak']
+
+# scale factor of the median absolute deviation to the standard deviation of normal noise
+MAD_SCALE = 1.4826
+
+# fields of the perf_logging_format in config/config.py, preceded by %(check_job_completion_time)s
+RECORD = re.compile(
+    rb'^(\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d)\S* reframe: .*?\|name=([^|]*)\|system=([^|]*)\|partition=([^|]*)'
+    rb'\|environ=([^|]*)\|.*?\|perf_var=([^|]*)\|perf_value=([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\|'
+    rb'unit=([^|\n]*)',
+    re.MULTILINE,
+)
+
+KEY_FIELDS = ['name', 'system', 'partition', 'environ', 'perf_var']
+
+# perflogs, and perflogs that ReFrame renamed to <perflog>.h<n> because the format of their header changed
+PERFLOG_PATTERNS = ['*.log', '*.log.h[0-9]*']
+
+
+def perflog_files(perflog_dir):
+    "return sorted list of the perflog files in perflog_dir, including the renamed perflogs of older formats"
+    return sorted(
+        x for pattern in PERFLOG_PATTERNS for x in glob.glob(os.path.join(perflog_dir, '**', pattern), recursive=True)
+    )
+
+
+def read_perflogs(paths):
+    """
+    return dict of NumPy arrays of the numeric performance records in the perflog files:
+    time (datetime64), the fields of KEY_FIELDS and unit (bytes), and value (float)
+    """
+    import numpy as np
+
+    records = []
+    for path in paths:
+        with open(path, 'rb') as perflog:
+            records.extend(RECORD.findall(perflog.read()))
+
+    fields = ['time', *KEY_FIELDS, 'value', 'unit']
+    if not records:
+        return {x: np.array([]) for x in fields}
+
+    columns = dict(zip(fields, (np.array(x) for x in zip(*records))))
+    columns['time'] = np.char.replace(columns['time'].astype('U19'), ' ', 'T').astype('datetime64[s]')
+    columns['value'] = columns['value'].astype(float)
+    return columns
+
+
+def group_records(columns):
+    """
+    sort the records by group and time
+    return the sorted columns, the group index of each record and the group keys
+    """
+    import numpy as np
+
+    keys = columns[KEY_FIELDS[0]]
+    for field in KEY_FIELDS[1:]:
+        keys = np.char.add(np.char.add(keys, b'|'), columns[field])
+    unique_keys, group = np.unique(keys, return_inverse=True)
+
+    order = np.lexsort((columns['time'], group))
+    columns = {x: y[order] for x, y in columns.items()}
+    return columns, group[order], [x.decode().split('|') for x in unique_keys]
+
+
+def group_bounds(group):
+    "return arrays of the index of the first record and of the record after the last record of each group"
+    import numpy as np
+
+    starts = np.flatnonzero(np.diff(group, prepend=-1))
+    ends = np.append(starts[1:], len(group))
+    return starts, ends
+
+
+def baselines(values, group, recent, window, min_history):
+    """
+    baseline and noise of each recent record: median and scaled MAD of the previous window values of its group
+    before the first recent value of the group
+    return arrays of the baseline, noise and number of values of the baseline (NaN without min_history values)
+    """
+    import numpy as np
+
+    starts, ends = group_bounds(group)
+    index = np.arange(len(values))
+    # first recent record of each group (end of the group if it has none)
+    first_recent = np.minimum.reduceat(np.where(recent, index, len(values)), starts) if len(values) else starts
+    first_recent = np.minimum(first_recent, ends)
+
+    rows = np.flatnonzero(recent)
+    end = first_recent[group[rows]]
+    cols = end[:, None] - window + np.arange(window)[None, :]
+    valid = cols >= starts[group[rows]][:, None]
+    windows = np.where(valid, values[np.clip(cols, 0, None)], np.nan)
+
+    count = valid.sum(axis=1)
+    enough = count >= max(min_history, 1)
+    median = np.full(len(rows), np.nan)
+    noise = np.full(len(rows), np.nan)
+    if enough.any():
+        median[enough] = np.nanmedian(windows[enough], axis=1)
+        noise[enough] = MAD_SCALE * np.nanmedian(np.abs(windows[enough] - median[enough, None]), axis=1)
+    return rows, median, noise, count
+
+
+def change_points(values, group, min_segment):
+    """
+    largest shift of the mean in the history of each group: the split of the values of the group in a left and a right
+    segment (of at least min_segment values) with the highest two-sample t statistic
+    return arrays of the index of the first record after the split, the t statistic and the relative shift of the
+    mean, per group (index -1 if no split is possible)
+    """
+    import numpy as np
+
+    starts, ends = group_bounds(group)
+    counts = ends - starts
+    # center the values of each group for the precision of the cumulative sums
+    means = np.bincount(group, weights=values) / counts
+    x = values - means[group]
+    csum = np.concatenate([[0], np.cumsum(x)])
+    csum2 = np.concatenate([[0], np.cumsum(x * x)])
+
+    split = np.arange(len(values))
+    start, end = starts[group], ends[group]
+    n_left, n_right = split - start, end - split
+    possible = (n_left >= min_segment) & (n_right >= min_segment)
+    n_left, n_right = np.maximum(n_left, 1), np.maximum(n_right, 1)
+
+    mean_left = (csum[split] - csum[start]) / n_left
+    mean_right = (csum[end] - csum[split]) / n_right
+    sq_left = csum2[split] - csum2[start] - n_left * mean_left ** 2
+    sq_right = csum2[end] - csum2[split] - n_right * mean_right ** 2
+    dof = np.maximum(counts[group] - 2, 1)
+    pooled = np.sqrt(np.maximum(sq_left + sq_right, 0) / dof)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.abs(mean_left - mean_right) / (pooled * np.sqrt(1 / n_left + 1 / n_right))
+        shift = (mean_right - mean_left) / (mean_left + means[group])
+    t = np.where(possible & np.isfinite(t), t, -1)
+
+    best_t = np.maximum.reduceat(t, starts) if len(values) else t
+    is_best = t == best_t[group]
+    best_groups, first = np.unique(group[is_best], return_index=True)
+    best = np.full(len(starts), -1)
+    best[best_groups] = np.flatnonzero(is_best)[first]
+    best = np.where(best_t > 0, best, -1)
+    return best, np.where(best >= 0, best_t, np.nan), np.where(best >= 0, shift[best], np.nan)
+
+
+def direction(perf_var, unit):
+    "1 if higher values of the performance variable are better, -1 if lower values are better, 0 if neither"
+    if any(fnmatch(perf_var, x) for x in CONFIG_VARS):
+        return 0
+    if unit in LOWER_IS_BETTER_UNITS or any(fnmatch(perf_var, x) for x in LOWER_IS_BETTER_VARS):
+        return -1
+    return 1
+
+
+def worse(perf_var, unit, change):
+    "True if a change of the value is a regression of the performance variable"
+    return direction(perf_var, unit) * change < 0
+
+
+def analyse(columns, since, window=20, threshold=4.0, min_history=8, min_segment=5, cp_threshold=8.0,
+            min_shift=0.05):
+    """
+    return lists of the flagged recent records (outside the noise band of their baseline) and of the significant
+    change points (t statistic above cp_threshold and relative shift of at least min_shift) as dicts
+    """
+    import numpy as np
+
+    if not len(columns['value']):
+        return [], []
+
+    columns, group, keys = group_records(columns)
+    values = columns['value']
+
+    rows, median, noise, count = baselines(values, group, columns['time'] >= since, window, min_history)
+    deviation = values[rows] - median
+    # a noise band of 0 (identical values) still allows changes below 0.1 %
+    band = threshold * np.maximum(noise, 1e-3 * np.abs(median))
+    with np.errstate(invalid='ignore'):
+        outside = np.abs(deviation) > band
+
+    flagged = []
+    for i, row in enumerate(rows):
+        if not outside[i]:
+            continue
+        unit = columns['unit'][row].decode()
+        key = dict(zip(KEY_FIELDS, keys[group[row]]))
+        flagged.append({
+            **key,
+            'time': str(columns['time'][row]),
+            'value': float(values[row]),
+            'unit': unit,
+            'baseline': float(median[i]),
+            'noise': float(noise[i]),
+            'history': int(count[i]),
+            'change': float(deviation[i] / median[i]) if median[i] else None,
+            'regression': bool(worse(key['perf_var'], unit, deviation[i])),
+        })
+
+    splits, t, shift = change_points(values, group, min_segment)
+    changes = []
+    for g in np.flatnonzero((t > cp_threshold) & (np.abs(shift) >= min_shift)):
+        unit = columns['unit'][splits[g]].decode()
+        key = dict(zip(KEY_FIELDS, keys[g]))
+        changes.append({
+            **key,
+            'time': str(columns['time'][splits[g]]),
+            'unit': unit,
+            't': float(t[g]),
+            'shift': float(shift[g]),
+            'regression': bool(worse(key['perf_var'], unit, shift[g])),
+        })
+    return flagged, changes
+
+
+def print_report(flagged, changes):
+    print(f'{len(flagged)} recent values outside the noise band of their baseline')
+    for x in sorted(flagged, key=lambda x: (not x['regression'], x['name'], x['perf_var'], x['time'])):
+        change = f'{100 * x["change"]:+.1f}%' if x['change'] is not None else ''
+        print(f'  {"REGRESSION" if x["regression"] else "improvement"} {x["time"]} {x["name"]} '
+              f'{x["system"]}:{x["partition"]}+{x["environ"]} {x["perf_var"]}={x["value"]:g} {x["unit"]} '
+              f'(baseline {x["baseline"]:g} +/- {x["noise"]:g} of {x["history"]} values, {change})')
+
+    print(f'{len(changes)} change points in the history')
+    for x in sorted(changes, key=lambda x: (not x['regression'], x['name'], x['perf_var'])):
+        print(f'  {"REGRESSION" if x["regression"] else "improvement"} since {x["time"]} {x["name"]} '
+              f'{x["system"]}:{x["partition"]}+{x["environ"]} {x["perf_var"]} {100 * x["shift"]:+.1f}% '
+              f'(t={x["t"]:.1f})')
+
+
+def main():
+    parser = ArgumentParser(description='detect performance regressions in the perflogs of ReFrame')
+    parser.add_argument('--perflog-dir', default=os.getenv('RFM_PERFLOG_DIR', 'perflogs'),
+                        help='directory of the perflogs (default: RFM_PERFLOG_DIR)')
+    parser.add_argument('--since', type=float, default=7, help='days of recent values to check')
+    parser.add_argument('--window', type=int, default=20, help='number of values of the baseline')
+    parser.add_argument('--threshold', type=float, default=4.0, help='width of the noise band in MADs')
+    parser.add_argument('--min-history', type=int, default=8, help='minimum number of values of a baseline')
+    parser.add_argument('--cp-threshold', type=float, default=8.0, help='minimum t statistic of a change point')
+    parser.add_argument('--min-shift', type=float, default=0.05, help='minimum relative shift of a change point')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    try:
+        import numpy as np
+    except ImportError:
+        sys.exit('vubhpc.perflogs needs NumPy, load a module that provides it (e.g. SciPy-bundle)')
+
+    columns = read_perflogs(perflog_files(args.perflog_dir))
+    since = np.datetime64(datetime.now() - timedelta(days=args.since), 's')
+    flagged, changes = analyse(columns, since, args.window, args.threshold, args.min_history,
+                               cp_threshold=args.cp_threshold, min_shift=args.min_shift)
+    print(f'{len(columns["value"])} performance values in {args.perflog_dir}')
+    print_report(flagged, changes)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as jsonfile:
+            json.dump({'flagged': flagged, 'change_points': changes}, jsonfile, indent=1)
+
+    sys.exit(1 if any(x['regression'] for x in flagged) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+SQLite store of the performance records in the perflogs of ReFrame
+
+the perflogs written by the 'filelog' handler in config/config.py grow forever, this store keeps their records in an
+indexed table, so that the history of a test can be queried without reading all perflogs:
+    python3 -m vubhpc.perfstore ingest
+    python3 -m vubhpc.perfstore query --name 'OSULatencyTest*' --partition zen4-mpi --perf-var latency_small
+
+ingestion is incremental: the store remembers the byte offset up to which each perflog has been read, and only
+reads the lines appended since then (a perflog that shrank or was replaced is read again from the start); a perflog
+that ReFrame renamed to <perflog>.h<n> (when the format of its records changed) keeps the offset of its old path
+the store is the file perflogs.db in the perflog directory, unless another path is given
+"""
+
+from argparse import ArgumentParser
+import os
+import re
+import sqlite3
+import sys
+
+from vubhpc.perflogs import perflog_files
+
+# fields of the perf_logging_format in config/config.py, in the order of the columns of the store
+FIELDS = [
+    'username', 'version', 'commit', 'name', 'system', 'partition', 'environ', 'num_tasks', 'num_cpus_per_task',
+    'num_tasks_per_node', 'modules', 'jobid', 'perf_var', 'perf_value', 'unit', 'nodelist',
+]
+
+# fields that can be used to filter and group records in queries
+KEY_FIELDS = ['name', 'system', 'partition', 'environ', 'perf_var', 'unit', 'username', 'version', 'commit']
+
+# SQLite date formats of the periods of aggregation
+PERIODS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+STORE_NAME = 'perflogs.db'
+
+
+def store_path(perflog_dir):
+    return os.path.join(perflog_dir, STORE_NAME)
+
+
+def column(name):
+    "quoted column name (commit is an SQL keyword)"
+    return f'"{name}"'
+
+
+def connect(path):
+    "open the store at path, create or extend its tables and indexes"
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE IF NOT EXISTS perflogs (path TEXT PRIMARY KEY, inode INTEGER, bytes_read INTEGER)')
+    db.execute('CREATE TABLE IF NOT EXISTS records (time TEXT NOT NULL, perflog TEXT NOT NULL)')
+    existing = [x[1] for x in db.execute('PRAGMA table_info(records)')]
+    for field in FIELDS:
+        if field not in existing:
+            db.execute(f'ALTER TABLE records ADD COLUMN {column(field)} {"REAL" if field == "perf_value" else "TEXT"}')
+    db.execute('CREATE INDEX IF NOT EXISTS records_test ON records (name, partition, environ, perf_var, time)')
+    db.execute('CREATE INDEX IF NOT EXISTS records_perf_var ON records (perf_var, partition, time)')
+    db.execute('CREATE INDEX IF NOT EXISTS records_time ON records (time)')
+    return db
+
+
+def parse_record(line, perflog):
+    """
+    return tuple of the time, perflog and FIELDS of a line of a perflog, None if it is not a performance record
+    the time is the job completion time in ISO format, non-numeric performance values are NULL
+    """
+    time, sep, record = line.partition(' reframe: ')
+    if not sep or len(time) < 19:
+        return None
+    fields = dict(x.split('=', 1) for x in record.rstrip('\n').split('|') if '=' in x)
+    try:
+        fields['perf_value'] = float(fields['perf_value'])
+    except (KeyError, ValueError):
+        fields['perf_value'] = None
+    return (time[:19].replace(' ', 'T'), perflog, *(fields.get(x) for x in FIELDS))
+
+
+def ingest(perflog_dir, path=None):
+    "add the records appended to the perflogs in perflog_dir since the last ingestion to the store, return their number"
+    db = connect(path or store_path(perflog_dir))
+    offsets = {x: (inode, offset) for x, inode, offset in db.execute('SELECT path, inode, bytes_read FROM perflogs')}
+    insert = (
+        f'INSERT INTO records (time, perflog, {", ".join(column(x) for x in FIELDS)}) '
+        f'VALUES ({", ".join("?" * (len(FIELDS) + 2))})'
+    )
+
+    count = 0
+    with db:
+        for perflog in perflog_files(perflog_dir):
+            name = os.path.relpath(perflog, perflog_dir)
+            stat = os.stat(perflog)
+            # a renamed perflog is the same file (inode) as the one ingested under its old path
+            renamed = offsets.get(re.sub(r'\.h\d+$', '', name), (None, 0))
+            inode, offset = offsets.get(name, renamed if renamed[0] == stat.st_ino else (stat.st_ino, 0))
+            if inode != stat.st_ino or offset > stat.st_size:
+                offset = 0
+            if offset == stat.st_size:
+                continue
+
+            with open(perflog, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            # only complete lines, a record that is being written is read in the next ingestion
+            data = data[:data.rfind(b'\n') + 1]
+            records = [parse_record(x, name) for x in data.decode(errors='replace').splitlines()]
+            records = [x for x in records if x]
+            db.executemany(insert, records)
+            db.execute('INSERT OR REPLACE INTO perflogs VALUES (?, ?, ?)', (name, stat.st_ino, offset + len(data)))
+            count += len(records)
+    db.close()
+    return count
+
+
+def query(path, filters=None, since=None, until=None, group_by=None, period=None, limit=None):
+    """
+    return list of column names and list of rows of the records in the store at path
+    filters: dict of glob patterns of KEY_FIELDS, since/until: ISO dates or times (until is exclusive)
+    without group_by and period: the time, key fields, value and nodes of each record, in order of time
+    with group_by (list of KEY_FIELDS) and/or period (one of PERIODS): the number, minimum, mean and maximum of the
+    values of each group
+    """
+    where, args = ['perf_value IS NOT NULL'], []
+    for field, pattern in (filters or {}).items():
+        if pattern is not None:
+            where.append(f'{column(field)} GLOB ?')
+            args.append(pattern)
+    if since:
+        where.append('time >= ?')
+        args.append(since)
+    if until:
+        where.append('time < ?')
+        args.append(until)
+    where = ' AND '.join(where)
+
+    if group_by or period:
+        keys = [column(x) for x in group_by or []]
+        if period:
+            keys.insert(0, f"strftime('{PERIODS[period]}', time)")
+        names = ([period] if period else []) + list(group_by or []) + ['count', 'min', 'mean', 'max', 'unit']
+        sql = (
+            f'SELECT {", ".join(keys)}, count(*), min(perf_value), avg(perf_value), max(perf_value), max(unit) '
+            f'FROM records WHERE {where} GROUP BY {", ".join(keys)} ORDER BY {", ".join(keys)}'
+        )
+    else:
+        names = ['time', 'name', 'system', 'partition', 'environ', 'perf_var', 'perf_value', 'unit', 'nodelist']
+        sql = f'SELECT {", ".join(column(x) for x in names)} FROM records WHERE {where} ORDER BY time'
+
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    rows = db.execute(sql, args).fetchall()
+    db.close()
+    return names, rows
+
+
+def format_value(value):
+    return f'{value:g}' if isinstance(value, float) else str(value)
+
+
+def main():
+    parser = ArgumentParser(description='store and query the performance records of the perflogs of ReFrame')
+    parser.add_argument('action', choices=['ingest', 'query'], help='action to perform')
+    parser.add_argument('--perflog-dir', default=os.getenv('RFM_PERFLOG_DIR', 'perflogs'),
+                        help='directory of the perflogs (default: RFM_PERFLOG_DIR)')
+    parser.add_argument('--store', help=f'path of the store (default: {STORE_NAME} in the perflog directory)')
+    for field in KEY_FIELDS:
+        parser.add_argument(f'--{field.replace("_", "-")}', help=f'glob pattern of the {field} of the records')
+    parser.add_argument('--since', help='first date or time (ISO format) of the records')
+    parser.add_argument('--until', help='date or time (ISO format) after the last record')
+    parser.add_argument('--group-by', nargs='+', default=[], choices=KEY_FIELDS, metavar='field',
+                        help=f'aggregate the records per value of these fields: {", ".join(KEY_FIELDS)}')
+    parser.add_argument('--period', choices=sorted(PERIODS), help='aggregate the records per period')
+    parser.add_argument('--limit', type=int, help='maximum number of rows')
+    args = parser.parse_args()
+
+    path = args.store or store_path(args.perflog_dir)
+
+    if args.action == 'ingest':
+        count = ingest(args.perflog_dir, path)
+        print(f'ingested {count} performance records into {path}')
+        return
+
+    if not os.path.isfile(path):
+        sys.exit(f'no store at {path}, run the ingest action first')
+
+    filters = {x: getattr(args, x) for x in KEY_FIELDS}
+    names, rows = query(path, filters, args.since, args.until, args.group_by, args.period, args.limit)
+    print(' '.join(names))
+    for row in rows:
+        print(' '.join(format_value(x) for x in row))
+
+
+if __name__ == '__main__':
+    main()
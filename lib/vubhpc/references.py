@@ -0,0 +1,138 @@
+"""
+performance references of the tests, generated from the history of their performance values
+
+the references file (config/references.json, or REFRAME_REFERENCES) maps test name, system:partition, programming
+environment and performance variable to a ReFrame reference tuple [value, lower threshold, upper threshold, unit]
+generate it from the perflog store (see vubhpc.perfstore) after runs with known good performance:
+    python3 -m vubhpc.references
+
+the reference value is the median of the last `--window` values of each performance variable, the tolerance is
+`--factor` times the relative distance of the `--percentile` (or 100 - percentile) from the median, at least
+`--min-tolerance`; only the side of a regression is bounded: lower values of time units and of the variables in
+LOWER_IS_BETTER_VARS, higher values of all other variables are never a failure, and the variables in CONFIG_VARS get
+no reference (see direction() in vubhpc.perflogs)
+"""
+
+from argparse import ArgumentParser
+import itertools
+import json
+import os
+import statistics
+import sys
+
+import reframe as rfm
+from reframe.core.builtins import run_before, variable
+
+from vubhpc import perfstore
+from vubhpc.perflogs import direction
+
+REFRAME_HOME = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+default_references = os.getenv('REFRAME_REFERENCES', os.path.join(REFRAME_HOME, 'config', 'references.json'))
+
+# references files read in this session
+_references = {}
+
+
+def load_references(path):
+    "return the references in file path, empty dict if it does not exist"
+    if path not in _references:
+        try:
+            with open(path, encoding='utf-8') as f:
+                _references[path] = json.load(f)
+        except FileNotFoundError:
+            _references[path] = {}
+    return _references[path]
+
+
+def make_reference(values, perf_var, unit, percentile=5, factor=1.5, min_tolerance=0.05):
+    "return the reference tuple of the values, None if the median is not positive or the variable has no direction"
+    median = statistics.median(values)
+    if median <= 0 or not direction(perf_var, unit):
+        return None
+    quantiles = statistics.quantiles(values, n=100, method='inclusive')
+    if direction(perf_var, unit) < 0:
+        upper = factor * (quantiles[99 - percentile] / median - 1)
+        return [median, None, round(max(upper, min_tolerance), 4), unit]
+    lower = factor * (quantiles[percentile - 1] / median - 1)
+    return [median, round(min(lower, -min_tolerance), 4), None, unit]
+
+
+def generate(store, name='*', window=30, min_history=10, **kwargs):
+    "return the references of the records in store with a name matching glob pattern name"
+    names, rows = perfstore.query(store, {'name': name})
+    fields = [names.index(x) for x in ['name', 'system', 'partition', 'environ', 'perf_var', 'unit']]
+    value = names.index('perf_value')
+
+    def key(row):
+        return tuple(row[i] for i in fields)
+
+    references = {}
+    for (test, system, partition, environ, perf_var, unit), group in itertools.groupby(sorted(rows, key=key), key):
+        values = [row[value] for row in group][-window:]
+        if len(values) < max(min_history, 2):
+            continue
+        ref = make_reference(values, perf_var, unit, **kwargs)
+        if ref:
+            test_refs = references.setdefault(test, {}).setdefault(f'{system}:{partition}', {})
+            test_refs.setdefault(environ, {})[perf_var] = ref
+    return references
+
+
+class ReferenceMixin(rfm.RegressionMixin):
+    """
+    set the reference of each performance variable of the test from the references file, for the current partition
+    and programming environment
+    references defined by the test itself take precedence
+    """
+    # references file, empty string to disable
+    references_file = variable(str, value=default_references)
+
+    @run_before('performance')
+    def set_references(self):
+        if not self.references_file:
+            return
+        partition = self.current_partition.fullname
+        refs = load_references(self.references_file).get(self.name, {}).get(partition, {})
+        for perf_var, ref in refs.get(self.current_environ.name, {}).items():
+            if f'{partition}:{perf_var}' not in self.reference:
+                self.reference[f'{partition}:{perf_var}'] = tuple(ref)
+
+
+def main():
+    parser = ArgumentParser(description='generate the performance references of the tests from the perflog store')
+    parser.add_argument('--perflog-dir', default=os.getenv('RFM_PERFLOG_DIR', 'perflogs'),
+                        help='directory of the perflogs (default: RFM_PERFLOG_DIR)')
+    parser.add_argument('--store', help=f'path of the store (default: {perfstore.STORE_NAME} in the perflog directory)')
+    parser.add_argument('--output', default=default_references, help='references file')
+    parser.add_argument('--name', default='*', help='glob pattern of the names of the tests')
+    parser.add_argument('--window', type=int, default=30, help='number of last values of each performance variable')
+    parser.add_argument('--min-history', type=int, default=10, help='minimum number of values of a reference')
+    parser.add_argument('--percentile', type=int, default=5, help='percentile of the tolerance (1 to 49)')
+    parser.add_argument('--factor', type=float, default=1.5, help='factor of the tolerance')
+    parser.add_argument('--min-tolerance', type=float, default=0.05, help='minimum relative tolerance')
+    args = parser.parse_args()
+
+    if not 1 <= args.percentile <= 49:
+        parser.error('percentile must be between 1 and 49')
+
+    store = args.store or perfstore.store_path(args.perflog_dir)
+    count = perfstore.ingest(args.perflog_dir, store)
+    print(f'ingested {count} performance records into {store}')
+
+    references = generate(store, args.name, args.window, args.min_history, percentile=args.percentile,
+                          factor=args.factor, min_tolerance=args.min_tolerance)
+    if args.name != '*':
+        # keep the references of the other tests
+        references = {**load_references(args.output), **references}
+    if not references:
+        sys.exit('no performance variables with enough history')
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(references, f, indent=1, sort_keys=True)
+    count = sum(len(x) for test in references.values() for part in test.values() for x in part.values())
+    print(f'wrote {count} references of {len(references)} tests to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
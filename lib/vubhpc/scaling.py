@@ -0,0 +1,109 @@
+from collections.abc import Callable
+import json
+import os
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+from reframe.core.builtins import run_after, run_before, sanity_function, variable
+
+from vubhpc import fit
+
+
+def amdahl_fit(threads, speedups):
+    """
+    least-squares fit of Amdahl's law S(n) = 1 / (s + (1 - s) / n) to the speedups at the given thread counts
+    return tuple of the serial fraction s and the fitted speedups
+    """
+    # 1 / S(n) = s + (1 - s) / n is linear in 1 / n, normalize so that S(1) = 1
+    a, b = fit.linear_fit([1 / n for n in threads], [1 / x for x in speedups])
+    serial = a / (a + b)
+    return serial, [1 / (serial + (1 - serial) / n) for n in threads]
+
+
+class ThreadScalingMixin(rfm.RegressionMixin):
+    """
+    run a multi-threaded benchmark with 1, 2, 4, ... threads up to all cores of the node, as steps of a single job
+    the benchmark command is the executable of the test, with OMP_NUM_THREADS set to the number of threads of each
+    step; subclasses set thread_result to a function that parses the result of a step from its output file
+    reports the result, speedup and parallel efficiency at each thread count, and the serial fraction of the fit of
+    Amdahl's law to the speedups
+    tests should have exclusive access to the node
+    """
+    # maximum number of threads, 0 for all cores of the node (determined at run time)
+    max_threads = variable(int, value=0)
+    # name and unit of the result of a step, and whether it is a rate (higher is better) or a time
+    scaling_metric = 'speed'
+    scaling_unit = ''
+    scaling_rate = True
+    scaling_file = 'thread_scaling.json'
+    # function that returns the result of the step with output file path, None if the step failed
+    thread_result = variable(Callable)
+
+    def thread_output(self, threads):
+        return f'threads{threads}.out'
+
+    @run_after('setup')
+    def set_num_cpus(self):
+        self.num_cpus_per_task = self.max_threads or self.current_partition.processor.num_cpus
+        self.keep_files = [self.scaling_file, self.thread_output('*')]
+
+    @run_before('run', always_last=True)
+    def set_thread_steps(self):
+        "run the executable at each thread count, the main command only prints the thread counts"
+        cmd = ' '.join([self.executable, *self.executable_opts])
+        self.prerun_cmds += [
+            f'MAX_THREADS={self.max_threads or "$(nproc)"}',
+            'THREADS=',
+            'for (( n = 1; n < MAX_THREADS; n *= 2 )); do THREADS+="$n "; done',
+            'THREADS+=$MAX_THREADS',
+            'for n in $THREADS; do',
+            f'    (export OMP_NUM_THREADS=$n; {cmd}) > {self.thread_output("$n")} 2>&1',
+            'done',
+        ]
+        self.executable = 'echo'
+        self.executable_opts = ['"thread counts: $THREADS"']
+
+    @run_before('sanity')
+    def read_thread_results(self):
+        stdout = os.path.join(self.stagedir, sn.evaluate(self.stdout))
+        threads = sn.evaluate(sn.extractsingle(r'^thread counts: (.*)', stdout, 1)).split()
+        self.thread_counts = [int(x) for x in threads]
+        self.thread_results = {
+            n: self.thread_result(os.path.join(self.stagedir, self.thread_output(n))) for n in self.thread_counts
+        }
+
+    @sanity_function
+    def assert_thread_steps(self):
+        return sn.all([sn.assert_true(self.thread_counts, msg='no thread counts')] + [
+            sn.assert_true(result, msg=f'no result with {n} threads') for n, result in self.thread_results.items()
+        ])
+
+    @run_before('performance')
+    def fit_amdahl(self):
+        "compute speedups and efficiencies relative to 1 thread, fit Amdahl's law and save all in scaling_file"
+        base = self.thread_results[1]
+        threads = self.thread_counts
+        results = [self.thread_results[n] for n in threads]
+        speedups = [(x / base if self.scaling_rate else base / x) for x in results]
+        efficiencies = [100 * x / n for x, n in zip(speedups, threads)]
+
+        self.perf_variables = {}
+        for n, result, speedup, efficiency in zip(threads, results, speedups, efficiencies):
+            self.perf_variables.update({
+                f'{self.scaling_metric}_threads{n}': sn.make_performance_function(sn.defer(result), self.scaling_unit),
+                f'speedup_threads{n}': sn.make_performance_function(sn.defer(speedup), ''),
+                f'efficiency_threads{n}': sn.make_performance_function(sn.defer(efficiency), '%'),
+            })
+
+        scaling = {'threads': threads, self.scaling_metric: results, 'speedup': speedups, 'efficiency': efficiencies}
+        if len(threads) > 1:
+            serial, fitted = amdahl_fit(threads, speedups)
+            residual = fit.relative_residual(speedups, fitted)
+            self.perf_variables.update({
+                'serial_fraction': sn.make_performance_function(sn.defer(100 * serial), '%'),
+                'fit_residual': sn.make_performance_function(sn.defer(residual), '%'),
+            })
+            scaling.update({'serial_fraction': serial, 'speedup_fitted': fitted})
+
+        with open(os.path.join(self.stagedir, self.scaling_file), 'w') as f:
+            json.dump(scaling, f, indent=1)
@@ -0,0 +1,289 @@
+"""
+source archives used by the tests
+
+all archives are listed in SOURCES with their download URL (None if it cannot be downloaded directly), their
+location relative to REFRAME_SOURCEPATH and their sha256 checksum (None if not known yet: the checksum of the first
+download is recorded and used from then on)
+
+fetch() downloads a missing archive and verifies it. Downloads are protected with a lock file and written to a
+temporary file that is only renamed once verified, so concurrent sessions never download the same archive twice
+or read a partial one. In a read-only REFRAME_SOURCEPATH, archives are verified without lock file and without
+recording their checksum, missing archives cannot be downloaded there. Set REFRAME_SOURCE_MIRROR to a URL or a local
+directory with the same layout as REFRAME_SOURCEPATH to download from a mirror instead, e.g. for offline testing.
+An archive is hashed at most once per process (sha256sum), also by the build cache and the input cache.
+
+fill REFRAME_SOURCEPATH with all archives before running the tests:
+    python3 -m vubhpc.sources prefetch
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import fcntl
+import hashlib
+import logging
+import os
+import sys
+import urllib.parse
+import urllib.request
+
+SOURCES = {
+    'osu-micro-benchmarks-5.6.2': {
+        'url': 'https://mvapich.cse.ohio-state.edu/download/mvapich/osu-micro-benchmarks-5.6.2.tar.gz',
+        'path': 'o/osu-micro-benchmarks/osu-micro-benchmarks-5.6.2.tar.gz',
+        'sha256': None,
+    },
+    'IOR-3.3.0': {
+        'url': 'https://github.com/hpc/ior/archive/3.3.0.tar.gz',
+        'path': 'i/IOR/3.3.0.tar.gz',
+        'sha256': None,
+    },
+    'BLAS-Tester-20160411': {
+        'url': 'https://github.com/xianyi/BLAS-Tester/archive/8e1f624.tar.gz',
+        'path': 'b/BLAS-Tester/BLAS-Tester-20160411.tar.gz',
+        'sha256': None,
+    },
+    'c-ray-1.1': {
+        'url': 'https://www.phoronix.net/downloads/phoronix-test-suite/benchmark-files/c-ray-1.1.tar.gz',
+        'path': 'c/c-ray/c-ray-1.1.tar.gz',
+        'sha256': None,
+    },
+    'benchMEM-20200626': {
+        'url': 'https://www.mpibpc.mpg.de/15101317/benchMEM.zip',
+        'path': 'b/benchMEM/benchMEM-20200626.zip',
+        'sha256': '3c1c8cd4f274d532f48c4668e1490d389486850d6b3b258dfad4581aa11380a4',
+    },
+    # larger GROMACS benchmarks, see https://www.mpinat.mpg.de/grubmueller/bench
+    'benchRIB': {
+        'url': None,
+        'path': 'b/benchRIB/benchRIB.zip',
+        'sha256': None,
+    },
+    'benchPEP': {
+        'url': None,
+        'path': 'b/benchPEP/benchPEP.zip',
+        'sha256': None,
+    },
+    'STREAM-5.10': {
+        'url': 'https://www.cs.virginia.edu/stream/FTP/Code/stream.c',
+        'path': 's/STREAM/5.10/stream.c',
+        'sha256': None,
+    },
+    'cp2k-6.1': {
+        'url': 'https://github.com/cp2k/cp2k/releases/download/v6.1.0/cp2k-6.1.tar.bz2',
+        'path': 'c/CP2K/cp2k-6.1.tar.bz2',
+        'sha256': None,
+    },
+}
+
+CHUNK_SIZE = 1 << 20
+
+log = logging.getLogger(__name__)
+
+# sha256 checksums of the files hashed by this process, by path, modification time and size
+_digests = {}
+
+
+class SourceError(Exception):
+    "error fetching or verifying a source archive"
+
+
+def source_path(name):
+    "absolute path of source archive name in REFRAME_SOURCEPATH"
+    return os.path.join(os.environ['REFRAME_SOURCEPATH'], SOURCES[name]['path'])
+
+
+def source_url(name):
+    "download URL of source archive name, taking REFRAME_SOURCE_MIRROR into account"
+    mirror = os.getenv('REFRAME_SOURCE_MIRROR')
+    if not mirror:
+        if not SOURCES[name]['url']:
+            raise SourceError(f'{name} cannot be downloaded, put it in {source_path(name)} or in a mirror')
+        return SOURCES[name]['url']
+
+    if not urllib.parse.urlparse(mirror).scheme:
+        mirror = 'file://' + os.path.abspath(mirror)
+    return f'{mirror.rstrip("/")}/{SOURCES[name]["path"]}'
+
+
+def _digest_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def sha256sum(path):
+    "sha256 checksum of the file at path, hashed only once per process while the file is not modified"
+    key = _digest_key(path)
+    if key not in _digests:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as srcfile:
+            for chunk in iter(lambda: srcfile.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        _digests[key] = sha256.hexdigest()
+    return _digests[key]
+
+
+def _recorded_checksum(path):
+    "checksum recorded next to a verified archive, if still valid"
+    try:
+        if os.path.getmtime(path + '.sha256') < os.path.getmtime(path):
+            return None
+        with open(path + '.sha256', 'r', encoding='utf-8') as sumfile:
+            return sumfile.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def _record_checksum(path, checksum):
+    with open(path + '.sha256', 'w', encoding='utf-8') as sumfile:
+        sumfile.write(f'{checksum}  {os.path.basename(path)}\n')
+
+
+def checksum(name):
+    "sha256 checksum of source archive name, or None if it is unknown and the archive is missing"
+    if SOURCES[name]['sha256']:
+        return SOURCES[name]['sha256']
+
+    path = source_path(name)
+    recorded = _recorded_checksum(path)
+    if recorded:
+        return recorded
+    if os.path.isfile(path):
+        return sha256sum(path)
+    return None
+
+
+def _verified(name, path, record=True):
+    """
+    check the archive at path against the manifest, hashing it only if it was not verified before
+    record: save the checksum next to the archive, so that it is not hashed again
+    """
+    expected = SOURCES[name]['sha256']
+    recorded = _recorded_checksum(path)
+    if recorded and (expected is None or recorded == expected):
+        return True
+
+    actual = sha256sum(path)
+    if expected and actual != expected:
+        log.warning('checksum mismatch for %s: expected %s, found %s', path, expected, actual)
+        return False
+
+    if record:
+        _record_checksum(path, actual)
+    return True
+
+
+def _download(name, path):
+    url = source_url(name)
+    partial = path + '.part'
+    log.info('downloading %s to %s', url, path)
+
+    sha256 = hashlib.sha256()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response, open(partial, 'wb') as partfile:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                partfile.write(chunk)
+    except OSError as err:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise SourceError(f'failed to download {url}: {err}') from err
+
+    expected = SOURCES[name]['sha256']
+    if expected and sha256.hexdigest() != expected:
+        os.remove(partial)
+        raise SourceError(f'checksum mismatch for {url}: expected {expected}, found {sha256.hexdigest()}')
+
+    os.replace(partial, path)
+    _digests[_digest_key(path)] = sha256.hexdigest()
+    _record_checksum(path, sha256.hexdigest())
+
+
+def fetch(name):
+    "make sure source archive name is present and verified in REFRAME_SOURCEPATH, return its path"
+    path = source_path(name)
+
+    # fast path without lock: archive was verified before
+    recorded = _recorded_checksum(path)
+    if recorded and SOURCES[name]['sha256'] in (None, recorded):
+        return path
+
+    directory = os.path.dirname(path)
+    if os.path.isdir(directory) and not os.access(directory, os.W_OK):
+        # shared read-only source path: no lock file, no recorded checksum, no download
+        if not os.path.isfile(path):
+            raise SourceError(f'{path} is missing and {directory} is read-only')
+        if not _verified(name, path, record=False):
+            raise SourceError(f'checksum mismatch for {path} in read-only {directory}')
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'w', encoding='utf-8') as lockfile:
+        fcntl.flock(lockfile, fcntl.LOCK_EX)
+        try:
+            if os.path.isfile(path) and _verified(name, path):
+                return path
+            _download(name, path)
+        finally:
+            fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    return path
+
+
+def prefetch(names=None, workers=8):
+    """
+    fetch the given source archives concurrently, return dict of name and error of failed fetches
+    by default, fetch all source archives that can be downloaded
+    """
+    if not names:
+        mirror = os.getenv('REFRAME_SOURCE_MIRROR')
+        names = [x for x in SOURCES if mirror or SOURCES[x]['url'] or os.path.isfile(source_path(x))]
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(fetch, name) for name in names}
+        for name, future in futures.items():
+            try:
+                log.info('%s: %s', name, future.result())
+            except (OSError, SourceError) as err:
+                errors[name] = err
+                log.error('%s: %s', name, err)
+    return errors
+
+
+def extract_cmd(name, dest):
+    """
+    shell command to extract source archive name (without its top-level directory) into dest
+    single source files (such as stream.c) are copied into dest
+    """
+    path = source_path(name)
+    if path.endswith('.c'):
+        return f'mkdir {dest} && cp {path} {dest}/'
+    if path.endswith('.zip'):
+        return f'mkdir {dest} && unzip -q {path} -d {dest}'
+    return f'mkdir {dest} && tar -xf {path} --strip-components 1 -C {dest}'
+
+
+def main():
+    parser = ArgumentParser(description='manage the source archives of the tests in REFRAME_SOURCEPATH')
+    parser.add_argument('action', choices=['prefetch', 'list'], help='action to perform')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f'source archives (default: all): {", ".join(SOURCES)}')
+    parser.add_argument('--workers', type=int, default=8, help='number of concurrent downloads')
+    args = parser.parse_args()
+
+    unknown = [x for x in args.names if x not in SOURCES]
+    if unknown:
+        parser.error(f'unknown source archives: {", ".join(unknown)}')
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.action == 'list':
+        for name in args.names or SOURCES:
+            print(f'{name} {source_path(name)} {checksum(name) or "unknown"}')
+        return
+
+    errors = prefetch(args.names, args.workers)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import json
+import os
+import statistics
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+
+from vubhpc.references import ReferenceMixin
+
+
+"""
+memory latency tests
+memlat <min size> <max size> <points per doubling> chases pointers through a random cycle of cache lines of each
+working set size, see src/memlat.c
+local: cores and memory in NUMA domain 0
+remote: cores in NUMA domain 0, memory in the NUMA domain farthest from domain 0 (skipped in nodes with 1 domain)
+"""
+
+
+def read_curve(path):
+    "return lists of the working set sizes and latencies in output file path of memlat"
+    rows = sn.evaluate(sn.extractall(r'^(\d+)\s+(\S+)$', path, tag=(1, 2), conv=(int, float)))
+    return [size for size, _ in rows], [latency for _, latency in rows]
+
+
+def plateau(sizes, latencies, low, high=None):
+    "median latency of the working sets larger than low and at most high bytes, None if there are none"
+    values = [y for x, y in zip(sizes, latencies) if x > low and (high is None or x <= high)]
+    return statistics.median(values) if values else None
+
+
+@rfm.simple_test
+class MemoryLatencyTest(rfm.RunOnlyRegressionTest, ReferenceMixin):
+    """
+    memory latency test, from the L1 cache to several times the last level cache, in local and remote memory
+    reports the latency plateau of each cache level and of local and remote memory
+    """
+    descr = 'memory latency pointer-chase test'
+    valid_systems = required
+    valid_prog_environs = required
+    time_limit = '30m'
+    num_tasks = 1
+    num_tasks_per_node = 1
+    num_cpus_per_task = 1
+    exclusive_access = True
+    curve_file = 'memlat_curve.json'
+    min_size = variable(int, value=4096)
+    # largest working set in multiples of the last level cache (at least 256 MiB)
+    llc_factor = variable(int, value=8)
+    points_per_doubling = variable(int, value=4)
+
+    @run_after('init')
+    def post_init(self):
+        self.depends_on('MemoryLatencyBuildTest')
+        self.keep_files = [self.curve_file, 'memlat_*.out']
+
+    def memlat_output(self, memory):
+        return f'memlat_{memory}.out'
+
+    @require_deps
+    def set_executable(self, MemoryLatencyBuildTest):
+        self.executable = os.path.join(MemoryLatencyBuildTest().stagedir, MemoryLatencyBuildTest().executable)
+
+    @run_before('run', always_last=True)
+    def set_runs(self):
+        "print the data caches of core 0, chase in local and remote memory, the main command only lists the runs"
+        memlat = f'{self.executable} {self.min_size} $MAX_BYTES {self.points_per_doubling}'
+        self.prerun_cmds += [
+            'for index in /sys/devices/system/cpu/cpu0/cache/index[0-9]*; do',
+            '    [[ $(<$index/type) == Instruction ]] && continue',
+            '    size=$(<$index/size)',
+            '    LLC_BYTES=$(( ${size%K} * 1024 ))',
+            '    echo "cache L$(<$index/level) $LLC_BYTES"',
+            'done',
+            f'MAX_BYTES=$(( {self.llc_factor} * LLC_BYTES > 1 << 28 ? {self.llc_factor} * LLC_BYTES : 1 << 28 ))',
+            "REMOTE_NODE=$(awk '{m = 1; for (i = 2; i <= NF; i++) if ($i > $(m)) m = i; print m - 1}' "
+            '/sys/devices/system/node/node0/distance)',
+            f'numactl --cpunodebind=0 --membind=0 {memlat} > {self.memlat_output("local")}',
+            'RUNS=local',
+            'if (( REMOTE_NODE > 0 )); then',
+            f'    numactl --cpunodebind=0 --membind=$REMOTE_NODE {memlat} > {self.memlat_output("remote")}',
+            '    RUNS+=" remote"',
+            'fi',
+        ]
+        self.executable = 'echo'
+        self.executable_opts = ['"memlat runs: $RUNS"']
+
+    @run_before('sanity')
+    def read_curves(self):
+        stdout = os.path.join(self.stagedir, sn.evaluate(self.stdout))
+        self.runs = sn.evaluate(sn.extractsingle(r'^memlat runs: (.*)', stdout, 1)).split()
+        self.caches = dict(sn.evaluate(sn.extractall(r'^cache (L\d) (\d+)', stdout, tag=(1, 2), conv=(str, int))))
+        self.curves = {}
+        for memory in self.runs:
+            path = os.path.join(self.stagedir, self.memlat_output(memory))
+            if sn.evaluate(sn.findall(r'^# memlat finished', path)):
+                self.curves[memory] = read_curve(path)
+
+    @sanity_function
+    def assert_run(self):
+        return sn.all([sn.assert_true(self.caches, msg='no data caches found')] + [
+            sn.assert_in(memory, self.curves, msg=f'memlat failed in {memory} memory') for memory in self.runs
+        ])
+
+    @run_before('performance')
+    def set_perf_variables(self):
+        """
+        latency plateau of each cache level: working sets between twice the previous level and half of the level
+        latency plateau of memory: working sets of at least 4 times the last level cache
+        save the curves and plateaus in curve_file
+        """
+        sizes, latencies = self.curves['local']
+        plateaus = {}
+        previous = 0
+        for level, size in sorted(self.caches.items()):
+            plateaus[level.lower()] = plateau(sizes, latencies, 2 * previous, size // 2)
+            previous = size
+        plateaus['memory'] = plateau(sizes, latencies, 4 * previous - 1)
+        if 'remote' in self.curves:
+            plateaus['memory_remote'] = plateau(*self.curves['remote'], 4 * previous - 1)
+
+        self.perf_variables = {
+            f'latency_{name}': sn.make_performance_function(sn.defer(value), 'ns')
+            for name, value in plateaus.items() if value is not None
+        }
+
+        curves = {memory: {'size': x, 'latency': y} for memory, (x, y) in self.curves.items()}
+        with open(os.path.join(self.stagedir, self.curve_file), 'w') as f:
+            json.dump({'caches': self.caches, 'plateaus': plateaus, **curves}, f, indent=1)
+
+
+@rfm.simple_test
+class MemoryLatencyBuildTest(rfm.CompileOnlyRegressionTest):
+    "memory latency build test"
+    descr = 'memory latency build test'
+    valid_systems = required
+    valid_prog_environs = required
+    build_locally = False
+    sourcepath = 'memlat.c'
+    executable = 'memlat'
+    build_system = 'SingleSource'
+    num_cpus_per_task = 1
+
+    @run_after('setup')
+    def set_resources(self):
+        self.build_job.num_tasks = 1
+        self.build_job.num_tasks_per_node = 1
+        self.build_job.num_cpus_per_task = self.num_cpus_per_task
+
+    @run_before('compile')
+    def set_build_system_options(self):
+        self.build_system.cflags = ['-O2']
+        self.build_system.ldflags = ['-lm']
+
+    @sanity_function
+    def validate_build(self):
+        return sn.assert_not_found('error', self.stderr)
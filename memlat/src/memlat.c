@@ -0,0 +1,110 @@
+/*
+ * memory latency benchmark: chase pointers through a random cycle of cache lines
+ *
+ * usage: memlat <min size> <max size> [points per doubling] [loads]
+ * prints the mean load-to-use latency in ns for working sets from min size to max size (in bytes)
+ *
+ * each load depends on the previous one, and the random order of the cache lines defeats the prefetchers,
+ * so that the latency of a load is the latency of the level of the memory hierarchy that holds the working set
+ */
+#define _GNU_SOURCE
+#include <math.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/mman.h>
+#include <time.h>
+
+#define LINE 64
+
+static uint64_t rng_state = 88172645463325252ULL;
+
+static uint64_t rng(void)
+{
+    rng_state ^= rng_state << 13;
+    rng_state ^= rng_state >> 7;
+    rng_state ^= rng_state << 17;
+    return rng_state;
+}
+
+static double now(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + 1e-9 * ts.tv_nsec;
+}
+
+/* link the first size bytes of buf into a random cycle of cache lines (Sattolo's algorithm) */
+static void make_cycle(char *buf, size_t *perm, size_t size)
+{
+    size_t lines = size / LINE;
+    for (size_t i = 0; i < lines; i++)
+        perm[i] = i;
+    for (size_t i = lines - 1; i > 0; i--) {
+        size_t j = rng() % i;
+        size_t tmp = perm[i];
+        perm[i] = perm[j];
+        perm[j] = tmp;
+    }
+    for (size_t i = 0; i < lines; i++)
+        *(void **)(buf + i * LINE) = buf + perm[i] * LINE;
+}
+
+/* mean latency of a load in ns, chasing loads pointers after a warm-up pass through the cycle */
+static double chase(char *buf, size_t size, long loads)
+{
+    void **p = (void **)buf;
+    for (size_t i = 0; i < size / LINE; i++)
+        p = (void **)*p;
+
+    double start = now();
+    for (long i = 0; i < loads; i++)
+        p = (void **)*p;
+    double elapsed = now() - start;
+
+    /* keep the chain alive */
+    if (p == NULL)
+        printf("#\n");
+    return 1e9 * elapsed / loads;
+}
+
+int main(int argc, char **argv)
+{
+    if (argc < 3) {
+        fprintf(stderr, "usage: %s <min size> <max size> [points per doubling] [loads]\n", argv[0]);
+        return 1;
+    }
+    size_t min_size = strtoull(argv[1], NULL, 10);
+    size_t max_size = strtoull(argv[2], NULL, 10);
+    int points = argc > 3 ? atoi(argv[3]) : 4;
+    long loads = argc > 4 ? atol(argv[4]) : 1L << 24;
+    if (min_size < 2 * LINE || max_size < min_size || points < 1 || loads < 1) {
+        fprintf(stderr, "invalid arguments\n");
+        return 1;
+    }
+
+    char *buf = mmap(NULL, max_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    size_t *perm = malloc(max_size / LINE * sizeof(size_t));
+    if (buf == MAP_FAILED || perm == NULL) {
+        fprintf(stderr, "failed to allocate %zu bytes\n", max_size);
+        return 1;
+    }
+    /* huge pages keep TLB misses out of the latency of the caches */
+    madvise(buf, max_size, MADV_HUGEPAGE);
+
+    printf("# size (B)  latency (ns)\n");
+    size_t last = 0;
+    for (int k = 0;; k++) {
+        size_t size = (size_t)(min_size * pow(2.0, (double)k / points)) / LINE * LINE;
+        if (size > max_size)
+            break;
+        if (size == last)
+            continue;
+        last = size;
+        make_cycle(buf, perm, size);
+        printf("%zu %.3f\n", size, chase(buf, size, loads));
+        fflush(stdout);
+    }
+    printf("# memlat finished\n");
+    return 0;
+}
@@ -1,16 +1,52 @@
+import json
+import math
 import os
+import random
+import statistics
 
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+from vubhpc import fit, sources
+from vubhpc.buildcache import BuildCacheMixin
+from vubhpc.references import ReferenceMixin
 
 src_name = 'osu-micro-benchmarks'
 src_version = '5.6.2'
 src_dir = f'{src_name}-{src_version}'
-src_url = 'https://mvapich.cse.ohio-state.edu/download/mvapich/{src_dir}.tar.gz'
-src_path = os.path.join(os.environ['REFRAME_SOURCEPATH'], src_name[0].lower(), src_name, f'{src_dir}.tar.gz')
 
-download_cmd = f'wget {src_url} -O {src_path}'
-extract_cmd = f'mkdir {src_dir} && tar -xzvf {src_path} --strip-components 1 -C {src_dir} && cd {src_dir}'
+extract_cmd = f'{sources.extract_cmd(src_dir, src_dir)} && cd {src_dir}'
+
+
+def read_curve(path):
+    "return lists of the message sizes and values in the output file of an OSU benchmark"
+    rows = sn.evaluate(sn.extractall(r'^(\d+)\s+(\S+)', path, tag=(1, 2), conv=(int, float)))
+    return [size for size, _ in rows], [value for _, value in rows]
+
+
+def tournament_rounds(num):
+    """
+    return list of rounds of disjoint pairs of the indices 0..num-1, such that each pair occurs in exactly one round
+    round-robin tournament (circle method): num-1 rounds for even num, num rounds for odd num
+    """
+    players = list(range(num)) + ([None] if num % 2 else [])
+    rounds = []
+    for _ in range(len(players) - 1):
+        pairs = [(players[i], players[-1 - i]) for i in range(len(players) // 2)]
+        rounds.append([tuple(sorted(pair)) for pair in pairs if None not in pair])
+        players = [players[0], players[-1]] + players[1:-1]
+    return rounds
+
+
+def robust_scores(values, higher_is_worse):
+    "return list of the deviations of values from their median in units of the (normal-consistent) MAD"
+    median = statistics.median(values)
+    mad = 1.4826 * statistics.median([abs(x - median) for x in values])
+    if not mad:
+        return [0.0] * len(values)
+    sign = 1 if higher_is_worse else -1
+    return [sign * (x - median) / mad for x in values]
 
 
 # executable options:
@@ -19,7 +55,7 @@ extract_cmd = f'mkdir {src_dir} && tar -xzvf {src_path} --strip-components 1 -C
 # -m message size (runs with increasing message size up to this value)
 
 
-class OSUTestBase(rfm.RunOnlyRegressionTest):
+class OSUTestBase(rfm.RunOnlyRegressionTest, ReferenceMixin):
     '''Base class of OSU benchmarks runtime tests'''
     valid_systems = required
     valid_prog_environs = required
@@ -32,15 +68,79 @@ class OSUTestBase(rfm.RunOnlyRegressionTest):
     # packet sizes
     size_small = str(2 << 10)
     size_big = str(64 << 10)
+    # largest message size of bandwidth tests, beyond the eager/rendezvous switch
+    size_max = str(1 << 20)
+
+    # full message size curve, saved in the output dir
+    curve_file = 'osu_curve.json'
 
     @run_after('init')
     def post_init(self):
         self.depends_on('OSUBuildTest')
+        self.keep_files = [self.curve_file]
 
     @sanity_function
     def assert_run(self):
         return sn.assert_found(r'^8', self.stdout)
 
+    def parse_curve(self):
+        "parse the full table of message sizes and values in one pass and save it as JSON"
+        if hasattr(self, 'curve_sizes'):
+            return
+
+        # hooks do not run in the stage dir
+        self.curve_sizes, self.curve_values = read_curve(os.path.join(self.stagedir, sn.evaluate(self.stdout)))
+        curve = {
+            'name': self.display_name,
+            'executable': os.path.basename(self.executable),
+            'sizes': self.curve_sizes,
+            'values': self.curve_values,
+        }
+        with open(os.path.join(self.stagedir, self.curve_file), 'w') as f:
+            json.dump(curve, f, indent=1)
+
+    @run_before('performance')
+    def save_curve(self):
+        self.parse_curve()
+
+
+class OSUHockneyMixin(rfm.RegressionMixin):
+    """
+    fit the Hockney (alpha-beta) model t(n) = alpha + n / beta to the message size curve of a point-to-point test
+    the fit minimizes the relative error of t, so that small and large messages weigh equally
+    """
+    def curve_times(self):
+        "return list of the transfer time in us for each message size of the curve"
+        return self.curve_values
+
+    @run_before('performance')
+    def fit_hockney(self):
+        self.parse_curve()
+        points = [(n, t) for n, t in zip(self.curve_sizes, self.curve_times()) if t > 0]
+        sizes = [n for n, _ in points]
+        times = [t for _, t in points]
+        alpha, slope = fit.linear_fit(sizes, times, weights=[1 / t**2 for t in times])
+        self.hockney_alpha = alpha
+        self.hockney_beta = 1 / slope if slope > 0 else float('inf')
+        self.hockney_residual = fit.relative_residual(times, [alpha + slope * n for n in sizes])
+
+    @performance_function('us', perf_key='latency_zero')
+    def latency_zero(self):
+        return self.hockney_alpha
+
+    @performance_function('MB/s', perf_key='bandwidth_asymptotic')
+    def bandwidth_asymptotic(self):
+        return self.hockney_beta
+
+    @performance_function('B', perf_key='size_half_bandwidth')
+    def size_half_bandwidth(self):
+        "message size at which half of the asymptotic bandwidth is reached"
+        return self.hockney_alpha * self.hockney_beta
+
+    @performance_function('%', perf_key='fit_residual')
+    def fit_residual(self):
+        return self.hockney_residual
+
 class OSUTestLatencyBase(OSUTestBase):
     "base class for OSU benchmarks that measure latency"
     @performance_function('us', perf_key='latency_small')
@@ -53,21 +153,18 @@ class OSUTestLatencyBase(OSUTestBase):
 
 
 @rfm.simple_test
-class OSULatencyTest(OSUTestLatencyBase):
+class OSULatencyTest(OSUTestLatencyBase, OSUHockneyMixin):
     descr = 'OSU latency test'
     tags = {'prod_small'}
 
     @require_deps
     def set_executable(self, OSUBuildTest):
-        self.executable = os.path.join(OSUBuildTest().stagedir, src_dir, 'mpi', 'one-sided', 'osu_get_latency')
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'one-sided', 'osu_get_latency')
         self.executable_opts = ['-x', '100', '-i', '10000']
 
 
-@rfm.simple_test
-class OSUBandwidthTest(OSUTestBase):
-    descr = 'OSU bandwidth test'
-    tags = {'prod_small'}
-
+class OSUTestBandwidthBase(OSUTestBase):
+    "base class for OSU benchmarks that measure bandwidth"
     @performance_function('MB/s', perf_key='bandwidth_small')
     def bandwidth_small(self):
         return sn.extractsingle(rf'^{self.size_small}\s+(\S+)', self.stdout, 1, float)
@@ -76,46 +173,442 @@ class OSUBandwidthTest(OSUTestBase):
     def bandwidth_big(self):
         return sn.extractsingle(rf'^{self.size_big}\s+(\S+)', self.stdout, 1, float)
 
+    def curve_times(self):
+        "transfer time in us for OSUHockneyMixin: 1 MB/s = 1 byte/us"
+        return [n / bw if bw else 0 for n, bw in zip(self.curve_sizes, self.curve_values)]
+
+
+@rfm.simple_test
+class OSUBandwidthTest(OSUTestBandwidthBase, OSUHockneyMixin):
+    descr = 'OSU bandwidth test'
+    tags = {'prod_small'}
+
+    @require_deps
+    def set_executable(self, OSUBuildTest):
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'one-sided', 'osu_get_bw')
+        self.executable_opts = ['-x', '100', '-i', '5000', '-m', self.size_max]
+
+
+@rfm.simple_test
+class OSUTwoSidedLatencyTest(OSUTestLatencyBase, OSUHockneyMixin):
+    descr = 'OSU two-sided latency test'
+    tags = {'prod_small'}
+    num_tasks = 2
+
+    @require_deps
+    def set_executable(self, OSUBuildTest):
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'pt2pt', 'osu_latency')
+        self.executable_opts = ['-x', '100', '-i', '10000']
+
+
+@rfm.simple_test
+class OSUTwoSidedBandwidthTest(OSUTestBandwidthBase, OSUHockneyMixin):
+    descr = 'OSU two-sided bandwidth test'
+    tags = {'prod_small'}
+    num_tasks = 2
+
+    @require_deps
+    def set_executable(self, OSUBuildTest):
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'pt2pt', 'osu_bw')
+        self.executable_opts = ['-x', '100', '-i', '5000', '-m', self.size_max]
+
+
+@rfm.simple_test
+class OSUBiBandwidthTest(OSUTestBandwidthBase):
+    descr = 'OSU bidirectional bandwidth test'
+    tags = {'prod_small'}
+    num_tasks = 2
+
+    @require_deps
+    def set_executable(self, OSUBuildTest):
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'pt2pt', 'osu_bibw')
+        self.executable_opts = ['-x', '100', '-i', '5000', '-m', self.size_max]
+
+
+@rfm.simple_test
+class OSUMessageRateTest(OSUTestBandwidthBase):
+    """
+    OSU multiple bandwidth / message rate test between 2 nodes
+    each task in the first node sends to a task in the second node
+    """
+    descr = 'OSU message rate test'
+    # 7 variants with exclusive nodes, not part of the weekly prod_small run
+    tags = {'message_rate'}
+    exclusive_access = True
+    pairs_per_node = parameter([1, 2, 4, 8, 16, 32, 64])
+    # message size of the message rate
+    size_tiny = '8'
+
+    @run_after('init')
+    def set_pairs(self):
+        self.descr += f' with {self.pairs_per_node} pairs per node'
+        self.num_tasks_per_node = self.pairs_per_node
+        self.num_tasks = 2 * self.pairs_per_node
+
+    @run_after('setup')
+    def skip_oversubscribed(self):
+        num_cpus = self.current_partition.processor.num_cpus
+        self.skip_if(num_cpus is not None and self.pairs_per_node > num_cpus,
+                     f'{self.pairs_per_node} pairs per node do not fit in {num_cpus} cores')
+
+    @performance_function('Messages/s', perf_key='message_rate')
+    def message_rate(self):
+        return sn.extractsingle(rf'^{self.size_tiny}\s+\S+\s+(\S+)', self.stdout, 1, float)
+
     @require_deps
     def set_executable(self, OSUBuildTest):
-        self.executable = os.path.join(OSUBuildTest().stagedir, src_dir, 'mpi', 'one-sided', 'osu_get_bw')
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'pt2pt', 'osu_mbw_mr')
         self.executable_opts = ['-x', '100', '-i', '5000', '-m', self.size_big]
 
 
+class OSUCollectiveTestBase(OSUTestLatencyBase):
+    """
+    base class of OSU collective benchmarks
+    the benchmark runs at 1, 2, 4, ... nodes up to max_nodes as separate job steps in a single job, and the latency
+    curves of all node counts are reduced into scaling metrics
+    with 1 task per node, the node counts start at 2 nodes
+    the number of iterations decreases with the number of tasks of each step, so that the steps with full nodes fit in
+    the time limit; the steps use srun options, the test is skipped with other launchers
+    latency_small and latency_big are the latencies at max_nodes
+    """
+    num_tasks = 0
+    time_limit = '30m'
+    # number of tasks per node, 'full' for 1 task per core
+    tasks_per_node = parameter([1, 8, 'full'])
+    # maximum number of nodes, 0 to use the 'max_nodes' extra of the partition (default 2)
+    max_nodes = variable(int, value=0)
+    # number of iterations with 2 tasks, divided by the number of tasks / 2 in larger steps, at least min_iterations
+    iterations = variable(int, value=20000)
+    min_iterations = variable(int, value=100)
+    # latency curves of all node counts, saved in the output dir
+    scaling_file = 'osu_scaling.json'
+
+    @run_after('init')
+    def set_tasks_per_node(self):
+        self.descr += f' with {self.tasks_per_node} tasks per node'
+        self.keep_files += [self.scaling_file]
+
+    @run_after('setup')
+    def set_node_counts(self):
+        self.skip_if(self.job.launcher.registered_name != 'srun',
+                     f'the job steps need the srun launcher, not {self.job.launcher.registered_name}')
+        num_cpus = self.current_partition.processor.num_cpus
+        if self.tasks_per_node == 'full':
+            self.skip_if(num_cpus is None, 'number of cores of the partition is unknown')
+            self.num_tasks_per_node = num_cpus
+        else:
+            self.skip_if(num_cpus is not None and self.tasks_per_node > num_cpus,
+                         f'{self.tasks_per_node} tasks per node do not fit in {num_cpus} cores')
+            self.num_tasks_per_node = self.tasks_per_node
+
+        # collectives need at least 2 tasks: start at the smallest node count with 2 tasks
+        max_nodes = self.max_nodes or self.current_partition.extras.get('max_nodes', 2)
+        self.node_counts = [
+            1 << i for i in range(max_nodes.bit_length())
+            if 1 << i < max_nodes and (1 << i) * self.num_tasks_per_node >= 2
+        ] + [max_nodes]
+        self.skip_if(len(self.node_counts) < 2,
+                     f'scaling needs at least 2 node counts with 2 tasks, max_nodes is {max_nodes}')
+        self.num_tasks = max_nodes * self.num_tasks_per_node
+
+    def node_count_output(self, nodes):
+        return f'osu_nodes{nodes}.out'
+
+    def iteration_opts(self, tasks):
+        "options of the number of iterations (and 5 % warmup iterations) of a step with the given number of tasks"
+        iterations = max(self.min_iterations, self.iterations * 2 // tasks)
+        return ['-x', f'{max(iterations // 20, 1)}', '-i', f'{iterations}']
+
+    @run_before('run')
+    def set_job_steps(self):
+        "run the smaller node counts as job steps before the main run at max_nodes"
+        launcher = self.job.launcher.run_command(self.job)
+        self.prerun_cmds = []
+        for n in self.node_counts[:-1]:
+            tasks = n * self.num_tasks_per_node
+            command = ' '.join([self.executable, *self.executable_opts, *self.iteration_opts(tasks)])
+            self.prerun_cmds.append(
+                f'{launcher} --nodes={n} --ntasks={tasks} --cpus-per-task={self.num_cpus_per_task} '
+                f'{command} > {self.node_count_output(n)}'
+            )
+        self.executable_opts += self.iteration_opts(self.num_tasks)
+
+    @sanity_function
+    def assert_run(self):
+        return sn.all([sn.assert_found(r'^8', self.stdout)] + [
+            sn.assert_found(r'^8', self.node_count_output(n)) for n in self.node_counts[:-1]
+        ])
+
+    @run_before('performance')
+    def fit_scaling(self):
+        "fit latency = a + b * log2(P) with P the number of tasks, for the small and big message sizes"
+        self.parse_curve()
+        curves = {n: read_curve(os.path.join(self.stagedir, self.node_count_output(n))) for n in self.node_counts[:-1]}
+        curves[self.node_counts[-1]] = (self.curve_sizes, self.curve_values)
+        with open(os.path.join(self.stagedir, self.scaling_file), 'w') as f:
+            json.dump({
+                'name': self.display_name,
+                'executable': os.path.basename(self.executable),
+                'tasks_per_node': self.num_tasks_per_node,
+                'curves': {n: {'sizes': sizes, 'values': values} for n, (sizes, values) in curves.items()},
+            }, f, indent=1)
+
+        self.scaling = {}
+        for size in [self.size_small, self.size_big]:
+            log_tasks = [math.log2(n * self.num_tasks_per_node) for n in self.node_counts]
+            latencies = [dict(zip(*curves[n]))[int(size)] for n in self.node_counts]
+            _, slope = fit.linear_fit(log_tasks, latencies)
+            # geometric mean of the latency ratio of successive doublings of the number of tasks
+            growth = (latencies[-1] / latencies[0]) ** (1 / (log_tasks[-1] - log_tasks[0])) - 1
+            self.scaling[size] = {'slope': slope, 'growth': 100 * growth}
+
+    @performance_function('us', perf_key='latency_log_slope_small')
+    def latency_log_slope_small(self):
+        "increase of the latency per doubling of the number of tasks, fitted over all node counts"
+        return self.scaling[self.size_small]['slope']
+
+    @performance_function('us', perf_key='latency_log_slope_big')
+    def latency_log_slope_big(self):
+        return self.scaling[self.size_big]['slope']
+
+    @performance_function('%', perf_key='latency_growth_small')
+    def latency_growth_small(self):
+        "average relative increase of the latency per doubling of the number of tasks"
+        return self.scaling[self.size_small]['growth']
+
+    @performance_function('%', perf_key='latency_growth_big')
+    def latency_growth_big(self):
+        return self.scaling[self.size_big]['growth']
+
+
 @rfm.simple_test
-class OSUAlltoallTest(OSUTestLatencyBase):
+class OSUAlltoallTest(OSUCollectiveTestBase):
     descr = 'OSU Alltoall test'
     tags = {'prod_big'}
 
     @require_deps
     def set_executable(self, OSUBuildTest):
-        self.executable = os.path.join(OSUBuildTest().stagedir, src_dir, 'mpi', 'collective', 'osu_alltoall')
-        self.executable_opts = ['-x', '1000', '-i', '20000']
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'collective', 'osu_alltoall')
+        self.executable_opts = ['-m', self.size_big]
+
 
 @rfm.simple_test
-class OSUAllreduceTest(OSUTestLatencyBase):
+class OSUAllreduceTest(OSUCollectiveTestBase):
     descr = 'OSU Allreduce test'
     tags = {'prod_big'}
 
     @require_deps
     def set_executable(self, OSUBuildTest):
-        self.executable = os.path.join(OSUBuildTest().stagedir, src_dir, 'mpi', 'collective', 'osu_allreduce')
-        self.executable_opts = ['-x', '1000', '-i', '20000']
+        self.executable = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'collective', 'osu_allreduce')
+        self.executable_opts = ['-m', self.size_big]
+
+
+@rfm.simple_test
+class OSUNetworkSweepTest(rfm.RunOnlyRegressionTest, ReferenceMixin):
+    """
+    all-pairs network health sweep
+    measures the two-sided latency and bandwidth between every pair of nodes of the job (or a random sample of
+    rounds), running the disjoint pairs of each round of a round-robin tournament concurrently
+    only the num_nodes nodes that Slurm allocates to the job are swept, not all nodes of the partition: set num_nodes
+    to the size of the partition to cover all of its nodes
+    the result is a matrix of all pairs in osu_pairs.json and a ranked list of outlier links and nodes in
+    osu_outliers.txt; outliers are scored by their deviation from the median in units of the MAD
+    """
+    descr = 'OSU all-pairs network sweep'
+    valid_systems = required
+    valid_prog_environs = required
+    num_tasks_per_node = 1
+    num_cpus_per_task = 1
+    exclusive_access = True
+    time_limit = '1h'
+    tags = {'network'}
+    executable = 'echo'
+    executable_opts = ['network sweep finished']
+
+    # number of nodes, 0 to use the 'max_nodes' extra of the partition (default 2)
+    num_nodes = variable(int, value=0)
+    # number of randomly selected rounds, 0 to measure all pairs
+    sample_rounds = variable(int, value=0)
+    sample_seed = variable(int, value=0)
+    # links and nodes with a score above this threshold are reported as outliers
+    outlier_threshold = variable(float, value=5.0)
+
+    size_small = OSUTestBase.size_small
+    size_big = OSUTestBase.size_big
+    pairs_file = 'osu_pairs.json'
+    outliers_file = 'osu_outliers.txt'
+    nodes_file = 'nodes.txt'
+
+    @run_after('init')
+    def post_init(self):
+        self.depends_on('OSUBuildTest')
+        self.keep_files = [self.pairs_file, self.outliers_file]
+
+    @run_after('setup')
+    def set_rounds(self):
+        num_nodes = self.num_nodes or self.current_partition.extras.get('max_nodes', 2)
+        self.skip_if(num_nodes < 2, 'network sweep needs at least 2 nodes')
+        self.num_tasks = num_nodes
+        self.rounds = tournament_rounds(num_nodes)
+        if 0 < self.sample_rounds < len(self.rounds):
+            self.rounds = random.Random(self.sample_seed).sample(self.rounds, self.sample_rounds)
+
+    @require_deps
+    def set_benchmarks(self, OSUBuildTest):
+        pt2pt = os.path.join(OSUBuildTest().build_prefix, 'mpi', 'pt2pt')
+        self.benchmarks = {
+            'latency': [os.path.join(pt2pt, 'osu_latency'), '-x', '100', '-i', '1000', '-m', self.size_small],
+            'bandwidth': [os.path.join(pt2pt, 'osu_bw'), '-x', '10', '-i', '100', '-m', self.size_big],
+        }
+
+    def pair_output(self, benchmark, pair):
+        return f'{benchmark}_{pair[0]}_{pair[1]}.out'
+
+    @run_before('run')
+    def set_job_steps(self):
+        "run the pairs of each round concurrently as job steps, the main command only runs locally"
+        launcher = self.job.launcher.run_command(self.job)
+        self.job.launcher = getlauncher('local')()
+        self.prerun_cmds = [
+            f'scontrol show hostnames "$SLURM_JOB_NODELIST" > {self.nodes_file}',
+            f'mapfile -t nodes < {self.nodes_file}',
+        ]
+        for pairs in self.rounds:
+            for benchmark, command in self.benchmarks.items():
+                self.prerun_cmds += [
+                    f'{launcher} --nodes=2 --ntasks=2 --ntasks-per-node=1 --nodelist=${{nodes[{i}]}},${{nodes[{j}]}} '
+                    f'{" ".join(command)} > {self.pair_output(benchmark, (i, j))} &'
+                    for i, j in pairs
+                ]
+                self.prerun_cmds.append('wait')
+
+    def read_pair(self, benchmark, pair, size):
+        "return the value of the benchmark for the message size, or None if the pair failed"
+        path = os.path.join(self.stagedir, self.pair_output(benchmark, pair))
+        if not os.path.exists(path):
+            return None
+        return dict(zip(*read_curve(path))).get(int(size))
+
+    @run_before('sanity')
+    def analyse_pairs(self):
+        "build the pair matrix and rank the outlier links and nodes"
+        self.nodes, self.links, self.failed_links, self.node_scores = [], [], [], []
+        path = os.path.join(self.stagedir, self.nodes_file)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.nodes = f.read().split()
+        if len(self.nodes) < self.num_tasks:
+            # the job failed before the sweep, the sanity check reports it
+            return
+        nodes = self.nodes
+
+        links = []
+        for pair in sorted(pair for pairs in self.rounds for pair in pairs):
+            latency = self.read_pair('latency', pair, self.size_small)
+            bandwidth = self.read_pair('bandwidth', pair, self.size_big)
+            links.append({'nodes': [nodes[i] for i in pair], 'latency': latency, 'bandwidth': bandwidth})
+        self.failed_links = [x for x in links if None in (x['latency'], x['bandwidth'])]
+        self.links = [x for x in links if x not in self.failed_links]
+
+        if self.links:
+            latency_scores = robust_scores([x['latency'] for x in self.links], higher_is_worse=True)
+            bandwidth_scores = robust_scores([x['bandwidth'] for x in self.links], higher_is_worse=False)
+            for link, lat_score, bw_score in zip(self.links, latency_scores, bandwidth_scores):
+                link['score'] = max(lat_score, bw_score)
+            self.links.sort(key=lambda x: x['score'], reverse=True)
+
+        # a bad node shows up in all of its links, a bad link only in one
+        node_links = {node: [] for node in nodes}
+        for link in self.links:
+            for node in link['nodes']:
+                node_links[node].append(link['score'])
+        self.node_scores = sorted(
+            [(node, statistics.median(scores)) for node, scores in node_links.items() if scores],
+            key=lambda x: x[1], reverse=True,
+        )
+
+        index = {node: i for i, node in enumerate(nodes)}
+        matrix = {name: [[None] * len(nodes) for _ in nodes] for name in ['latency', 'bandwidth']}
+        for link in links:
+            i, j = (index[node] for node in link['nodes'])
+            for name in matrix:
+                matrix[name][i][j] = matrix[name][j][i] = link[name]
+
+        with open(os.path.join(self.stagedir, self.pairs_file), 'w') as f:
+            json.dump({
+                'name': self.display_name,
+                'nodes': nodes,
+                'units': {'latency': f'us at {self.size_small} B', 'bandwidth': f'MB/s at {self.size_big} B'},
+                **matrix,
+                'links': self.links,
+                'failed_links': [x['nodes'] for x in self.failed_links],
+                'node_scores': dict(self.node_scores),
+            }, f, indent=1)
+
+        with open(os.path.join(self.stagedir, self.outliers_file), 'w') as f:
+            f.write(f'# {len(links)} links between {len(nodes)} nodes, outlier threshold {self.outlier_threshold}\n')
+            for link in self.failed_links:
+                f.write(f'failed link {" ".join(link["nodes"])}\n')
+            for link in self.links:
+                if link['score'] > self.outlier_threshold:
+                    f.write(f'outlier link {" ".join(link["nodes"])} score {link["score"]:.1f} '
+                            f'latency {link["latency"]} us bandwidth {link["bandwidth"]} MB/s\n')
+            for node, score in self.node_scores:
+                if score > self.outlier_threshold:
+                    f.write(f'outlier node {node} score {score:.1f}\n')
+
+    @sanity_function
+    def assert_run(self):
+        return sn.all([
+            sn.assert_found('network sweep finished', self.stdout),
+            sn.assert_ge(len(self.nodes), self.num_tasks,
+                         msg=f'{len(self.nodes)} nodes in {self.nodes_file}: the job failed before the sweep'),
+            sn.assert_false(self.failed_links, msg='failed links: ' + ', '.join(
+                '-'.join(x['nodes']) for x in self.failed_links)),
+        ])
+
+    @performance_function('us', perf_key='latency_median')
+    def latency_median(self):
+        return statistics.median([x['latency'] for x in self.links])
+
+    @performance_function('us', perf_key='latency_max')
+    def latency_max(self):
+        return max(x['latency'] for x in self.links)
+
+    @performance_function('MB/s', perf_key='bandwidth_median')
+    def bandwidth_median(self):
+        return statistics.median([x['bandwidth'] for x in self.links])
+
+    @performance_function('MB/s', perf_key='bandwidth_min')
+    def bandwidth_min(self):
+        return min(x['bandwidth'] for x in self.links)
+
+    @performance_function('links', perf_key='outlier_links')
+    def outlier_links(self):
+        return len([x for x in self.links if x['score'] > self.outlier_threshold])
+
+    @performance_function('nodes', perf_key='outlier_nodes')
+    def outlier_nodes(self):
+        return len([x for x in self.node_scores if x[1] > self.outlier_threshold])
+
 
 @rfm.simple_test
-class OSUBuildTest(rfm.CompileOnlyRegressionTest):
+class OSUBuildTest(rfm.CompileOnlyRegressionTest, BuildCacheMixin):
     descr = 'OSU benchmarks build test'
     valid_systems = required
     valid_prog_environs = required
     sourcesdir = None
-    prebuild_cmds = [
-        download_cmd if not os.path.isfile(src_path) else '',
-        extract_cmd,
-    ]
+    prebuild_cmds = [extract_cmd]
     build_system = 'Autotools'
     tags = {'prod_small', 'prod_big'}
     build_locally = False
     num_cpus_per_task = required
+    build_cache_sources = [src_dir]
+    build_cache_tree = src_dir
+
+    @run_after('setup')
+    def fetch_sources(self):
+        sources.fetch(src_dir)
 
     @run_after('setup')
     def set_resources(self):
@@ -2,10 +2,22 @@
 # -*- coding: utf-8 -*-
 
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter
+import ast
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import glob
+import importlib.util
+import json
 import os
 from pprint import pprint
+import re
+import shlex
+import statistics
+import subprocess
 import sys
 
+from vubhpc.perflogs import direction
+
 
 class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
     pass
@@ -17,13 +29,23 @@ parser = ArgumentParser(
 * options '--checkpath' and '--name' correspond to the ReFrame options with the same name
 * options '--system' and '--partitions' set ReFrame options '--system' and '--setvar valid_systems='
 * option '--valid_prog_environs' sets ReFrame option '--setvar valid_prog_environs='
+* options '--all' and multiple '--checkpath' run all selected tests in a single ReFrame session
+  (one session per group of tests with conflicting ReFrame options such as '--job-option' or '--exec-policy'),
+  with all test variables scoped to the test classes of each test
+* option '--node-sweep' runs the selected test on every node of the single partition in '--partitions', in one
+  ReFrame session per node (ReFrame option '--job-option nodelist=<node>') with at most '--sweep-width' concurrent
+  sessions, and prints a pass/fail table of the nodes against the median of all nodes
+  the nodelist also applies to the build jobs: run the tests once without '--node-sweep' to fill the build cache,
+  so that the sessions of the sweep reuse the cached build instead of building on each node
 
 any additional options not listed here are passed directly to ReFrame
 ''',
 )
 
-parser.add_argument('-c', '--checkpath', dest='checkpath', required=True,
+parser.add_argument('-c', '--checkpath', dest='checkpath', action='append',
                     help='path (relative to this script) of test directory or script')
+parser.add_argument('--all', dest='all', action='store_true',
+                    help='run all tests in a single session')
 parser.add_argument('-n', '--name', dest='name', action='append',
                     help='check name')
 parser.add_argument('--system', dest='system', choices=['anansi', 'hydra', 'local', 'manticore'],
@@ -32,12 +54,25 @@ parser.add_argument('--partitions', dest='partitions',
                     help='comma-separated list of ReFrame partitions')
 parser.add_argument('--valid_prog_environs', dest='valid_prog_environs',
                     help='comma-separated list of programming environments')
+parser.add_argument('--node-sweep', dest='node_sweep', action='store_true',
+                    help='run the selected test on each node of the partition')
+parser.add_argument('--nodes', dest='nodes',
+                    help='comma-separated list of nodes of the node sweep (default: all responding nodes in Slurm '
+                    'states idle, mixed or allocated)')
+parser.add_argument('--sweep-width', dest='sweep_width', type=int, default=8,
+                    help='maximum number of concurrent sessions of the node sweep')
+parser.add_argument('--sweep-threshold', dest='sweep_threshold', type=float, default=0.1,
+                    help='maximum relative deviation of a node from the median of all nodes in the node sweep')
+
+REFRAME_HOME = os.path.dirname(os.path.abspath(__file__))
 
-args, extra_args = parser.parse_known_args()
+# options in 'extra' that are replaced by test selection in merged sessions
+# the execution policy is kept: tests with the 'serial' policy (such as the IOR tests, which use the same paths in
+# all partitions) must not run concurrently
+MERGED_IGNORE_EXTRA = ['tag', 'exclude-tag']
 
-system = args.system
-checkpath = args.checkpath
-name = args.name
+# Slurm states of the nodes of a node sweep
+SWEEP_NODE_STATES = 'idle,mixed,allocated'
 
 tests = [
     {
@@ -54,6 +89,26 @@ tests = [
         },
         'extra': {
             'exec-policy': 'serial',
+            'exclude-tag': 'thread_scaling',
+        },
+    },
+    {
+        'checkpath': 'c-ray',
+        'valid_prog_environs': ['foss-2024a'],
+        'valid_systems': {
+            'hydra': ['hydra:skylake-sn', 'hydra:zen4-sn', 'hydra:zen5-sn'],
+            'manticore': ['manticore:zen3-sn'],
+            'local': ['local:local'],
+        },
+        'setvar_extra': {
+            'c_rayBuildTest.num_cpus_per_task': '4',
+            'c_rayTestMC.num_cpus_per_task': '4',
+            'c_rayTestSC.exclusive_access': 'false',
+            'c_rayTestMC.exclusive_access': 'false',
+        },
+        'extra': {
+            'exec-policy': 'serial',
+            'exclude-tag': 'thread_scaling',
         },
     },
     {
@@ -153,8 +208,14 @@ tests = [
             'iorBuildTest.num_cpus_per_task': '4',
             'iorWriteTest.num_tasks': '4',
             'iorReadTest.num_tasks': '4',
-            'iorWriteTest.exclusive_access': 'false',
-            'iorReadTest.exclusive_access': 'false',
+            'iorWriteTest.exclusive_access': 'true',
+            'iorReadTest.exclusive_access': 'true',
+            'mdtestTest.num_tasks': '4',
+            'mdtestTest.exclusive_access': 'false',
+            'iorScalingTest.max_nodes': '4',
+            'iorScalingTest.exclusive_access': 'true',
+            'iorAPITest.num_tasks': '4',
+            'iorAPITest.exclusive_access': 'true',
         },
         'extra': {
             'exec-policy': 'serial',
@@ -172,6 +233,18 @@ tests = [
             'job-option': 'mem-per-cpu=1G',
         },
     },
+    {
+        'checkpath': 'memlat',
+        'valid_prog_environs': ['foss-2024a'],
+        'valid_systems': {
+            'hydra': ['hydra:skylake-sn', 'hydra:zen4-sn', 'hydra:zen5-sn'],
+            'manticore': ['manticore:zen3-sn'],
+            'local': ['local:local'],
+        },
+        'extra': {
+            'exec-policy': 'serial',
+        },
+    },
     {
         'checkpath': 'osu',
         'valid_prog_environs': ['foss-2024a', 'intel-2024a'],
@@ -186,12 +259,32 @@ tests = [
             'OSUBuildTest.num_cpus_per_task': '4',
             'OSULatencyTest.exclusive_access': 'false',
             'OSUBandwidthTest.exclusive_access': 'false',
+            'OSUTwoSidedLatencyTest.exclusive_access': 'false',
+            'OSUTwoSidedBandwidthTest.exclusive_access': 'false',
+            'OSUBiBandwidthTest.exclusive_access': 'false',
         },
         'extra': {
             'exec-policy': 'serial',
             'tag': 'prod_small',
         },
     },
+    {
+        # 2 exclusive nodes per pair count, on demand only: run.py -c osu -n OSUMessageRateTest
+        'checkpath': 'osu',
+        'name': ['OSUMessageRateTest'],
+        'valid_prog_environs': ['foss-2024a', 'intel-2024a'],
+        'valid_systems': {
+            'hydra': ['hydra:skylake-mn-mpi-ib', 'hydra:zen4-mpi', 'hydra:zen5-mpi'],
+            'manticore': ['manticore:zen3-mpi'],
+            'local': ['local:local-mpi'],
+        },
+        'setvar_extra': {
+            'OSUBuildTest.num_cpus_per_task': '4',
+        },
+        'extra': {
+            'exec-policy': 'serial',
+        },
+    },
     {
         'checkpath': 'slurm',
         'valid_systems': {
@@ -215,53 +308,397 @@ tests = [
             'job-option': 'mem-per-cpu=1G',
         },
     },
+    {
+        'checkpath': 'stream',
+        'valid_prog_environs': ['foss-2024a'],
+        'valid_systems': {
+            'hydra': ['hydra:skylake-sn', 'hydra:zen4-sn', 'hydra:zen5-sn'],
+            'manticore': ['manticore:zen3-sn'],
+            'local': ['local:local'],
+        },
+        'setvar_extra': {
+            'STREAMBuildTest.num_cpus_per_task': '4',
+        },
+        'extra': {
+            'exec-policy': 'serial',
+        },
+    },
 ]
 
-selected_tests = []
-for test in tests:
-    if checkpath == test['checkpath'] or checkpath.startswith(test['checkpath'] + os.sep):
-        if not name or not test.get('name') or name == test.get('name'):
-            selected_tests.append(test)
-
-num_selected = len(selected_tests)
-if num_selected != 1:
-    print(f'ERROR: {num_selected} tests selected, exactly 1 is required. Add option --name to narrow selection.')
-    pprint(selected_tests)
-    sys.exit(1)
-
-selected = selected_tests[0]
-
-if args.partitions:
-    partitions = args.partitions.split(',')
-    valid_systems = [f'{system}:{x}' for x in partitions]
-else:
-    valid_systems = selected['valid_systems'][system]
-
-if args.valid_prog_environs:
-    valid_prog_environs = args.valid_prog_environs.split(',')
-else:
-    valid_prog_environs = selected.get('valid_prog_environs', ['default'])
-
-name = selected.get('name', []) if not name else name
-
-cmd = [
-    'reframe --run --performance-report',
-    f'--checkpath {checkpath}',
-    ' '.join([f'--name {x}' for x in name]),
-    f'--system {system}',
-    f'--setvar valid_prog_environs={",".join(valid_prog_environs)}',
-    f'--setvar valid_systems={",".join(valid_systems)}',
-]
 
-if selected.get('setvar_extra'):
-    for key, val in selected['setvar_extra'].items():
-        cmd.append(f'--setvar {key}={val}')
+def select_tests(checkpath, name=None):
+    """
+    return the entries of the tests table matching checkpath and (optionally) the list of check names
+    entries with the given names take precedence over entries without names; without names, entries with names are
+    only selected if checkpath has no entries without names
+    """
+    matching = [x for x in tests if checkpath == x['checkpath'] or checkpath.startswith(x['checkpath'] + os.sep)]
+    unnamed = [x for x in matching if not x.get('name')]
+    if name:
+        return [x for x in matching if x.get('name') == name] or unnamed
+    return unnamed or matching
+
+
+def discover_checks(checkpath):
+    "return dict of class name and tags of the tests decorated with simple_test in checkpath"
+    path = os.path.join(REFRAME_HOME, checkpath)
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, '**', '*.py'), recursive=True))
+    else:
+        files = [path]
+
+    checks = {}
+    for filename in files:
+        with open(filename, 'r', encoding='utf-8') as pyfile:
+            tree = ast.parse(pyfile.read(), filename)
+
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            decorators = [getattr(x, 'attr', getattr(x, 'id', None)) for x in node.decorator_list]
+            if 'simple_test' not in decorators:
+                continue
+
+            checks[node.name] = set()
+            for stmt in node.body:
+                if isinstance(stmt, ast.Assign) and any(getattr(x, 'id', None) == 'tags' for x in stmt.targets):
+                    try:
+                        checks[node.name] = set(ast.literal_eval(stmt.value))
+                    except ValueError:
+                        pass
+
+    return checks
+
+
+def test_classes(test):
+    "return the names of the test classes selected by an entry of the tests table"
+    if test.get('name'):
+        return test['name']
+
+    checks = discover_checks(test['checkpath'])
+    tag = test.get('extra', {}).get('tag')
+    if tag:
+        checks = {x: tags for x, tags in checks.items() if any(re.search(tag, t) for t in tags)}
+    exclude_tag = test.get('extra', {}).get('exclude-tag')
+    if exclude_tag:
+        checks = {x: tags for x, tags in checks.items() if not any(re.search(exclude_tag, t) for t in tags)}
+
+    return list(checks)
+
+
+def reframe_cmd(args, extra_args):
+    """
+    build the ReFrame command line for the tests selected by args
+    returns the command as list of strings and the list of valid systems the command runs in
+    """
+    system = args.system
+    checkpath = args.checkpath[0]
+    name = args.name
+
+    selected_tests = select_tests(checkpath, name)
+    num_selected = len(selected_tests)
+    if num_selected != 1:
+        raise ValueError(
+            f'{num_selected} tests selected, exactly 1 is required. Add option --name to narrow selection.',
+            selected_tests,
+        )
+
+    selected = selected_tests[0]
+
+    if args.partitions:
+        partitions = args.partitions.split(',')
+        valid_systems = [f'{system}:{x}' for x in partitions]
+    else:
+        valid_systems = selected['valid_systems'][system]
+
+    if args.valid_prog_environs:
+        valid_prog_environs = args.valid_prog_environs.split(',')
+    else:
+        valid_prog_environs = selected.get('valid_prog_environs', ['default'])
+
+    name = selected.get('name', []) if not name else name
+
+    cmd = [
+        'reframe --run --performance-report',
+        f'--checkpath {checkpath}',
+        ' '.join([f'--name {x}' for x in name]),
+        f'--system {system}',
+        f'--setvar valid_prog_environs={",".join(valid_prog_environs)}',
+        f'--setvar valid_systems={",".join(valid_systems)}',
+    ]
+
+    if selected.get('setvar_extra'):
+        for key, val in selected['setvar_extra'].items():
+            cmd.append(f'--setvar {key}={val}')
+
+    if selected.get('extra'):
+        for key, val in selected['extra'].items():
+            cmd.append(f'--{key} {val}')
+
+    cmd.extend(extra_args)
+
+    return cmd, valid_systems
+
+
+def merged_reframe_cmds(args, extra_args):
+    """
+    build the ReFrame command lines that run all tests selected by args in as few sessions as possible
+    valid systems, programming environments and the variables in 'setvar_extra' are scoped to the test classes
+    of each entry of the tests table, so that the entries do not interfere with each other
+    returns a list of tuples of the command as list of strings and the list of valid systems the command runs in
+    """
+    system = args.system
+
+    if args.all:
+        selected_tests = [x for x in tests if system in x['valid_systems']]
+    else:
+        selected_tests = []
+        for checkpath in args.checkpath:
+            selected_tests.extend(x for x in select_tests(checkpath, args.name) if x not in selected_tests)
+
+    if not selected_tests:
+        raise ValueError('0 tests selected', selected_tests)
+
+    # options in 'extra' apply to all tests in a session: group the tests by those options
+    sessions = {}
+    for test in selected_tests:
+        extra = tuple((k, v) for k, v in test.get('extra', {}).items() if k not in MERGED_IGNORE_EXTRA)
+        sessions.setdefault(extra, []).append(test)
+
+    cmds = []
+    for extra, session_tests in sessions.items():
+        cmd = [
+            'reframe --run --performance-report',
+            f'--system {system}',
+        ]
+        session_valid_systems = []
+
+        for test in session_tests:
+            if args.partitions:
+                valid_systems = [f'{system}:{x}' for x in args.partitions.split(',')]
+            else:
+                valid_systems = test['valid_systems'][system]
+            session_valid_systems.extend(x for x in valid_systems if x not in session_valid_systems)
+
+            if args.valid_prog_environs:
+                valid_prog_environs = args.valid_prog_environs.split(',')
+            else:
+                valid_prog_environs = test.get('valid_prog_environs', ['default'])
+
+            checkpath_opt = f'--checkpath {test["checkpath"]}'
+            if checkpath_opt not in cmd:
+                cmd.append(checkpath_opt)
+
+            classes = test_classes(test)
+            scoped_vars = {key: val for key, val in test.get('setvar_extra', {}).items() if '.' in key}
+            for cls in classes:
+                cmd.append(f'--name {shlex.quote(f"^{cls}(%|$)")}')
+                cmd.append(f'--setvar {cls}.valid_prog_environs={",".join(valid_prog_environs)}')
+                cmd.append(f'--setvar {cls}.valid_systems={",".join(valid_systems)}')
+                for key, val in test.get('setvar_extra', {}).items():
+                    if '.' not in key:
+                        scoped_vars[f'{cls}.{key}'] = val
+
+            for key, val in scoped_vars.items():
+                cmd.append(f'--setvar {key}={val}')
+
+        for key, val in extra:
+            cmd.append(f'--{key} {val}')
+
+        cmd.extend(extra_args)
+        cmds.append((cmd, session_valid_systems))
+
+    return cmds
+
+
+def load_partition(system, partition):
+    "return the configuration of ReFrame partition system:partition in config/config.py"
+    spec = importlib.util.spec_from_file_location('config', os.path.join(REFRAME_HOME, 'config', 'config.py'))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+
+    for sysconfig in config.site_configuration['systems']:
+        if sysconfig['name'] == system:
+            for partconfig in sysconfig['partitions']:
+                if partconfig['name'] == partition:
+                    return partconfig
+
+    raise ValueError(f'partition {system}:{partition} not found in config/config.py', [])
+
+
+def partition_nodes(system, partition):
+    "return the responding nodes in SWEEP_NODE_STATES of the Slurm partitions in the access options of a partition"
+    access = load_partition(system, partition)['access']
+    cmd = [
+        'sinfo', '--noheader', '--Node', '--responding', f'--states={SWEEP_NODE_STATES}', '--format=%N',
+        *[x for x in access if x.startswith('--partition=')],
+    ]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return sorted(set(output.split()))
+
+
+def read_report(path):
+    """
+    return dict of the results of the test cases in a ReFrame report file, by test name and environment:
+    dict of the result and of the value and unit of each performance variable
+    the results of retries replace the earlier results
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as jsonfile:
+            report = json.load(jsonfile)
+    except (OSError, ValueError):
+        return {}
+
+    results = {}
+    for run in report['runs']:
+        for case in run['testcases']:
+            perfvalues = case.get('perfvalues') or {}
+            results[(case['name'], case['environ'])] = {
+                'result': case['result'],
+                'perfvalues': {key.split(':')[-1]: (x[0], x[4]) for key, x in perfvalues.items()},
+            }
+    return results
+
+
+def node_sweep(args, extra_args):
+    """
+    run the test selected by args in one ReFrame session per node of its partition, at most args.sweep_width
+    sessions at a time; each session has its own stage and output directories and report file
+    returns the sweep directory and dict of node and results of its session (see read_report)
+    """
+    partitions = (args.partitions or '').split(',')
+    if args.all or len(args.checkpath) > 1 or len(partitions) != 1 or not partitions[0]:
+        raise ValueError('a node sweep requires a single --checkpath and a single partition in --partitions', [])
+
+    nodes = args.nodes.split(',') if args.nodes else partition_nodes(args.system, partitions[0])
+    if not nodes:
+        raise ValueError(f'no nodes found in partition {partitions[0]}', [])
+
+    cmd, _ = reframe_cmd(args, extra_args)
+    sweepdir = os.path.join(
+        os.getenv('RFM_PREFIX', os.curdir), 'sweeps', f'{args.system}_{partitions[0]}_{datetime.now():%Y%m%d_%H%M%S}'
+    )
+
+    def run_node(node):
+        nodedir = os.path.join(sweepdir, node)
+        os.makedirs(nodedir)
+        report = os.path.join(nodedir, 'report.json')
+        node_cmd = ' '.join(cmd + [
+            f'--job-option nodelist={node}',
+            f'--stage {os.path.join(nodedir, "stage")}',
+            f'--output {os.path.join(nodedir, "output")}',
+            f'--report-file {report}',
+        ])
+        with open(os.path.join(nodedir, 'reframe.out'), 'w', encoding='utf-8') as log:
+            log.write(node_cmd + '\n')
+            log.flush()
+            subprocess.run(node_cmd, shell=True, stdout=log, stderr=subprocess.STDOUT, cwd=REFRAME_HOME,
+                           env=dict(os.environ, REFRAME_SESSION=f'sweep_{partitions[0]}_{node}'))
+        return read_report(report)
+
+    print(f'node sweep of {len(nodes)} nodes in {sweepdir}')
+    print(' '.join(cmd))
+    with ThreadPoolExecutor(max_workers=args.sweep_width) as executor:
+        results = dict(zip(nodes, executor.map(run_node, nodes)))
+
+    return sweepdir, results
+
+
+def sweep_failures(results, threshold):
+    """
+    compare the performance values of each node of a node sweep with the median of all nodes
+    a node fails if a test case failed or is missing, or if a performance value is worse than the median by more
+    than threshold (relative)
+    returns dict of node and list of reasons of its failure (empty if it passes), and dict of the median of each
+    performance variable
+    """
+    cases = sorted({case for node_results in results.values() for case in node_results})
+    values = {}
+    for node_results in results.values():
+        for case, result in node_results.items():
+            for var, (value, unit) in result['perfvalues'].items():
+                if value is not None:
+                    values.setdefault((*case, var), []).append(value)
+    medians = {key: statistics.median(x) for key, x in values.items()}
+
+    failures = {}
+    for node, node_results in results.items():
+        reasons = [] if node_results else ['no results in the report of the session']
+        for name, environ in cases:
+            result = node_results.get((name, environ))
+            if not result:
+                reasons.append(f'{name}+{environ}: missing')
+                continue
+            if result['result'] != 'pass':
+                reasons.append(f'{name}+{environ}: {result["result"]}')
+            for var, (value, unit) in result['perfvalues'].items():
+                median = medians.get((name, environ, var))
+                sign = direction(var, unit)
+                if value is None or not median or median < 0 or not sign:
+                    continue
+                worse = sign * (1 - value / median)
+                if worse > threshold:
+                    reasons.append(f'{name}+{environ}: {var}={value:g} {unit} is {100 * worse:.1f}% worse than '
+                                   f'the median {median:g}')
+        failures[node] = reasons
+
+    return failures, medians
+
+
+def report_sweep(sweepdir, results, threshold):
+    "print the pass/fail table of the nodes of a node sweep, save it in the sweep directory, return the failed nodes"
+    failures, medians = sweep_failures(results, threshold)
+
+    print('median of all nodes:')
+    for (name, environ, var), median in sorted(medians.items()):
+        print(f'  {name}+{environ}: {var}={median:g}')
+    for node, reasons in sorted(failures.items()):
+        print(f'{node} {"FAIL" if reasons else "PASS"}')
+        for reason in reasons:
+            print(f'  {reason}')
+
+    failed = [node for node, reasons in sorted(failures.items()) if reasons]
+    print(f'failed nodes: {",".join(failed)}')
+
+    with open(os.path.join(sweepdir, 'sweep.json'), 'w', encoding='utf-8') as jsonfile:
+        json.dump({
+            'failures': failures,
+            'medians': [[*key, value] for key, value in medians.items()],
+            'results': {node: [[*case, x] for case, x in node_results.items()] for node, node_results in
+                        results.items()},
+        }, jsonfile, indent=1)
+
+    return failed
+
+
+def main():
+    args, extra_args = parser.parse_known_args()
+
+    if not args.all and not args.checkpath:
+        parser.error('one of the arguments -c/--checkpath --all is required')
+
+    try:
+        if args.node_sweep:
+            sweepdir, results = node_sweep(args, extra_args)
+            # exit codes are 8 bits, 256 failed nodes would exit 0
+            sys.exit(min(len(report_sweep(sweepdir, results, args.sweep_threshold)), 1))
+        elif args.all or len(args.checkpath) > 1:
+            cmds = merged_reframe_cmds(args, extra_args)
+        else:
+            cmds = [reframe_cmd(args, extra_args)]
+    except ValueError as err:
+        print(f'ERROR: {err.args[0]}')
+        pprint(err.args[1])
+        sys.exit(1)
+
+    exitcode = 0
+    for cmd, _ in cmds:
+        print(' '.join(cmd))
+        if os.waitstatus_to_exitcode(os.system(' '.join(cmd))) != 0:
+            exitcode = 1
 
-if selected.get('extra'):
-    for key, val in selected['extra'].items():
-        cmd.append(f'--{key} {val}')
+    sys.exit(exitcode)
 
-cmd.extend(extra_args)
 
-print(' '.join(cmd))
-os.system(' '.join(cmd))
+if __name__ == '__main__':
+    main()
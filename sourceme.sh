@@ -3,6 +3,9 @@ ml ReFrame/4.7.4-GCCcore-13.3.0 GitPython/3.1.43-GCCcore-13.3.0
 export REFRAME_HOME=$PWD
 echo REFRAME_HOME=$REFRAME_HOME
 
+# shared helpers used by the tests
+export PYTHONPATH=$REFRAME_HOME/lib${PYTHONPATH:+:$PYTHONPATH}
+
 export REFRAME_SOURCEPATH='/apps/brussel/sources'
 
 export RFM_CONFIG_FILES=$REFRAME_HOME/config/config.py
@@ -0,0 +1,171 @@
+import os
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+
+from vubhpc import sources
+from vubhpc.buildcache import BuildCacheMixin
+from vubhpc.references import ReferenceMixin
+
+
+src_name = 'STREAM'
+src_version = '5.10'
+src_dir = f'{src_name}-{src_version}'
+
+extract_cmd = sources.extract_cmd(src_dir, src_dir)
+
+# total size in bytes of the last level caches of the node (one per group of CPUs sharing it)
+llc_cmd = (
+    'LLC_BYTES=$(for cache in /sys/devices/system/cpu/cpu[0-9]*/cache/index3; do '
+    'echo "$(<$cache/shared_cpu_list) $(<$cache/size)"; done | sort -u | awk \'{s += $2 * 1024} END {print s + 0}\')'
+)
+
+kernels = ['copy', 'scale', 'add', 'triad']
+
+"""
+STREAM runs
+node: all cores of the node, threads spread over the cores
+socket<s>: all cores of a socket with numactl, memory bound to the NUMA domains of the socket
+numa<n>: all cores of a NUMA domain with numactl, memory bound to the NUMA domain
+the number of threads of each run is the number of cores of its CPU set (nproc)
+"""
+
+
+@rfm.simple_test
+class STREAMTest(rfm.RunOnlyRegressionTest, ReferenceMixin):
+    "STREAM memory bandwidth test in the whole node, in each socket and in each NUMA domain"
+    descr = 'STREAM memory bandwidth test'
+    valid_systems = required
+    valid_prog_environs = required
+    time_limit = '30m'
+    num_tasks = 1
+    num_tasks_per_node = 1
+    exclusive_access = True
+    exe = 'stream'
+
+    @run_after('init')
+    def post_init(self):
+        self.depends_on('STREAMBuildTest')
+        self.keep_files = ['stream_*.out']
+        self.env_vars = {
+            'OMP_PLACES': 'cores',
+            'OMP_PROC_BIND': 'spread',
+        }
+
+    @run_after('setup')
+    def set_num_cpus(self):
+        self.num_cpus_per_task = self.current_partition.processor.num_cpus
+
+    def stream_output(self, domain):
+        return f'stream_{domain}.out'
+
+    @require_deps
+    def set_executable(self, STREAMBuildTest):
+        self.executable = os.path.join(STREAMBuildTest().build_prefix, self.exe)
+
+    @run_before('run', always_last=True)
+    def set_runs(self):
+        "run STREAM in the node, in each socket and in each NUMA domain, the main command only lists the runs"
+        stream = self.executable
+        numactl = 'numactl --cpunodebind=$nodes --membind=$nodes'
+        self.prerun_cmds += [
+            'declare -A SOCKET_NODES',
+            'NUMA_NODES=',
+            'for node in /sys/devices/system/node/node[0-9]*; do',
+            '    [[ -n $(<$node/cpulist) ]] || continue',
+            '    NUMA_NODES+="${node##*node} "',
+            '    socket=$(cat $node/cpu[0-9]*/topology/physical_package_id | head -n 1)',
+            '    SOCKET_NODES[$socket]+="${SOCKET_NODES[$socket]:+,}${node##*node}"',
+            'done',
+            f'OMP_NUM_THREADS=$(nproc) {stream} > {self.stream_output("node")} 2>&1',
+            'DOMAINS=node',
+            'for socket in $(printf "%s\\n" "${!SOCKET_NODES[@]}" | sort -n); do',
+            '    nodes=${SOCKET_NODES[$socket]}',
+            f'    OMP_NUM_THREADS=$({numactl} nproc) {numactl} {stream} > {self.stream_output("socket$socket")} 2>&1',
+            '    DOMAINS+=" socket$socket"',
+            'done',
+            'for nodes in $NUMA_NODES; do',
+            f'    OMP_NUM_THREADS=$({numactl} nproc) {numactl} {stream} > {self.stream_output("numa$nodes")} 2>&1',
+            '    DOMAINS+=" numa$nodes"',
+            'done',
+        ]
+        self.executable = 'echo'
+        self.executable_opts = ['"STREAM domains: $DOMAINS"']
+
+    @run_before('sanity')
+    def read_domains(self):
+        stdout = os.path.join(self.stagedir, sn.evaluate(self.stdout))
+        self.domains = sn.evaluate(sn.extractsingle(r'^STREAM domains: (.*)', stdout, 1)).split()
+
+    def bandwidth(self, domain, kernel):
+        "best rate of the kernel in the run of the domain, in MB/s"
+        return sn.extractsingle(rf'^{kernel.capitalize()}:\s+(\S+)', self.stream_output(domain), 1, float)
+
+    @sanity_function
+    def assert_run(self):
+        return sn.all([
+            sn.assert_found(r'^Solution Validates', self.stream_output(domain), msg=f'STREAM failed in {domain}')
+            for domain in self.domains
+        ])
+
+    @run_before('performance')
+    def set_perf_variables(self):
+        "all kernels in the whole node, triad in each socket and in each NUMA domain"
+        self.perf_variables = {
+            f'{kernel}_node': sn.make_performance_function(self.bandwidth('node', kernel), 'MB/s')
+            for kernel in kernels
+        }
+        for domain in self.domains[1:]:
+            self.perf_variables[f'triad_{domain}'] = sn.make_performance_function(
+                self.bandwidth(domain, 'triad'), 'MB/s'
+            )
+
+
+@rfm.simple_test
+class STREAMBuildTest(rfm.CompileOnlyRegressionTest, BuildCacheMixin):
+    """
+    STREAM build test
+    the arrays are 4 times larger than the last level caches of the node combined, at least 10M elements
+    """
+    descr = 'STREAM build test'
+    valid_systems = required
+    valid_prog_environs = required
+    build_locally = False
+    sourcesdir = None
+    prebuild_cmds = [
+        extract_cmd,
+        llc_cmd,
+        'STREAM_ARRAY_SIZE=$(( LLC_BYTES / 2 > 10000000 ? LLC_BYTES / 2 : 10000000 ))',
+        'echo "STREAM_ARRAY_SIZE=$STREAM_ARRAY_SIZE"',
+    ]
+    build_system = 'SingleSource'
+    num_cpus_per_task = required
+    build_cache_sources = [src_dir]
+    build_cache_tree = src_dir
+
+    @run_after('setup')
+    def fetch_sources(self):
+        sources.fetch(src_dir)
+
+    @run_after('setup')
+    def set_cpus_per_task(self):
+        self.build_job.num_cpus_per_task = self.num_cpus_per_task
+        self.build_job.num_tasks = 1
+        self.build_job.num_tasks_per_node = 1
+
+    @run_before('compile')
+    def set_build_system_options(self):
+        self.build_system.srcfile = os.path.join(src_dir, 'stream.c')
+        self.build_system.executable = os.path.join(src_dir, 'stream')
+        # arrays of 8-byte elements can exceed 2 GB
+        self.build_system.cflags = [
+            '-O3', '-mcmodel=medium', '-DNTIMES=20', '-DSTREAM_ARRAY_SIZE=$STREAM_ARRAY_SIZE',
+        ]
+        if self.current_environ.name.startswith('intel'):
+            self.build_system.cflags.append('-qopenmp')
+        else:
+            self.build_system.cflags.append('-fopenmp')
+
+    @sanity_function
+    def validate_build(self):
+        return sn.assert_not_found('error', self.stderr)